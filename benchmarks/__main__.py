@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.compare import ALPHA, THRESHOLD, compare
+from benchmarks.corpus import SIZES
+from benchmarks.suite import benchmarks
+from freesyntax.cache import CACHE_ENV
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Measure freesyntax, optionally against a baseline.",
+    )
+    parser.add_argument("-k", "--filter", action="append", default=[])
+    parser.add_argument("-n", "--samples", type=int, default=10)
+    parser.add_argument(
+        "--sizes",
+        default="small,medium",
+        help=f"synthetic corpora to use, of {', '.join(SIZES)}",
+    )
+    parser.add_argument("--directory", type=Path, default=Path(".benchmarks"))
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--list", action="store_true")
+    options = parser.parse_args(argv)
+
+    # Measure the uncached paths, unless a benchmark asks for a cache
+    os.environ.pop(CACHE_ENV, None)
+
+    sizes = options.sizes.split(",")
+    if unknown := set(sizes) - SIZES.keys():
+        parser.error(f"unknown sizes: {', '.join(sorted(unknown))}")
+    selected = [
+        benchmark
+        for benchmark in benchmarks(sizes)
+        if not options.filter
+        or any(pattern in benchmark.name for pattern in options.filter)
+    ]
+    if options.list:
+        for benchmark in selected:
+            print(benchmark.name)
+        return 0
+
+    baseline = None
+    if options.compare:
+        baseline = load(options.directory, options.compare)["results"]
+
+    results = {}
+    for benchmark in selected:
+        results[benchmark.name] = samples = benchmark.run(options.samples)
+        print(
+            f"{benchmark.name:<36} {_format(statistics.median(samples))}"
+            f" +- {_format(_spread(samples))}",
+            flush=True,
+        )
+
+    if options.save:
+        path = save(options.directory, options.save, results)
+        print(f"\nSaved to {path}")
+
+    if baseline is None:
+        return 0
+
+    print(
+        f"\nCompared to {options.compare!r} (p < {ALPHA},"
+        f" changes over {THRESHOLD:.0%}):"
+    )
+    comparisons = compare(baseline, results)
+    for comparison in comparisons:
+        print(
+            f"{comparison.name:<36} {_format(comparison.baseline)}"
+            f" -> {_format(comparison.current)}"
+            f" {comparison.change:+7.1%} p={comparison.p_value:.4f}"
+            f" {comparison.verdict}"
+        )
+    slower = [item for item in comparisons if item.verdict == "slower"]
+    return 1 if slower else 0
+
+
+def save(directory, name, results):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.json"
+    metadata = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    data = {"metadata": metadata, "results": results}
+    path.write_text(json.dumps(data, indent=2))
+    return path
+
+
+def load(directory, name):
+    return json.loads((directory / f"{name}.json").read_text())
+
+
+def _spread(samples):
+    return statistics.stdev(samples) if len(samples) > 1 else 0.0
+
+
+def _format(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit:<2}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from freesyntax.factory import RuleFactory
+from freesyntax.grammar import Match, Rule, Token
+from freesyntax.structs import AutoLeaf, Symbols, Tokens
+
+# Checks of the factory's modes against the default behavior, on the
+# rules of the README and on inputs they got wrong before.
+
+CHECKS = []
+
+
+def check(func):
+    CHECKS.append(func)
+    return func
+
+
+README_SOURCE = """
+define *greet* (name: str) ->
+    print(Hello, name)
+"""
+
+
+def add_readme_rules(factory):
+    @factory.funcdef(
+        Match["define"],
+        Token["STAR"],
+        Token["NAME"],
+        Token["STAR"],
+        Rule["parameters"],
+        Token["RARROW"],
+        Rule["suite"],
+    )
+    def fixer(node):
+        node.children[0].value = "def "
+        node.children[1].remove()
+        node.children[2].remove()
+        node.children[-3].prefix = str()
+        node.children[-2].replace(factory.tokens.leaf("COLON"))
+
+    return factory
+
+
+@check
+def readme_fixpoint():
+    # Edits made in place don't queue a node for its own transformer
+    expected = add_readme_rules(RuleFactory()).transform(README_SOURCE)
+    factory = add_readme_rules(RuleFactory(fixpoint=True))
+    assert factory.transform(README_SOURCE) == expected
+
+
+@check
+def idempotent_fixpoint():
+    factory = RuleFactory(fixpoint=True)
+
+    @factory.expr_stmt
+    def strip(node):
+        node.children[0].prefix = ""
+
+    assert factory.transform("x = 1\n") == "x = 1\n"
+
+
+@check
+def minimal_output_at_eof():
+    # Compound statements followed by a comment without a newline (the
+    # last DEDENT is on the line after the end), unchanged or not; the
+    # default mode gives str() of the tree.
+    sources = [
+        "if a:\n    b\n# end",
+        "def f():\n    return 1\n# c",
+        "x  = 1\nclass A:\n    pass\n    # c\n# d",
+    ]
+    for source in sources:
+        outputs = []
+        for minimal_output in (False, True):
+            factory = RuleFactory(minimal_output=minimal_output)
+
+            @factory.expr_stmt
+            def space(node):
+                node.children[1].prefix = " "
+
+            outputs.append(factory.transform(source))
+        assert outputs[0] == outputs[1], source
+
+
+@check
+def bound_factories():
+    # AutoLeaf, Tokens and Symbols resolve against the factory of the
+    # running transformer, with factories transforming in threads.
+    def make(tokens):
+        factory = RuleFactory()
+        for token, name in tokens:
+            factory.register_token(token, name)
+
+        @factory.expr_stmt
+        def mark(node):
+            leaf = AutoLeaf.MARK
+            seen.append((factory, leaf.value, leaf.type, Tokens.MARK))
+            assert Symbols.expr_stmt == node.type
+
+        return factory
+
+    seen = []
+    factories = [make([("!", "MARK")]), make([("$", "DOLLAR"), ("?", "MARK")])]
+    assert factories[0].tokens.MARK != factories[1].tokens.MARK
+    with ThreadPoolExecutor(4) as pool:
+        futures = [
+            pool.submit(factories[index % 2].transform, "x = 1\n")
+            for index in range(200)
+        ]
+        for future in futures:
+            future.result()
+    assert len(seen) == 200
+    for factory, value, type, number in seen:
+        mark = factory.tokens.leaf("MARK")
+        assert (value, type, number) == (mark.value, mark.type, mark.type)
+
+    try:
+        Symbols.expr_stmt
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Symbols is bound outside of transform()")
+
+
+def main():
+    failures = 0
+    for func in CHECKS:
+        try:
+            func()
+        except Exception:
+            failures += 1
+            print(f"{func.__name__}: failed")
+            traceback.print_exc()
+        else:
+            print(f"{func.__name__}: ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
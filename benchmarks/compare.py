@@ -0,0 +1,78 @@
+import math
+import statistics
+from dataclasses import dataclass
+
+# A change is reported when it is both significant (two-sided p-value
+# of the Mann-Whitney U test under ALPHA) and larger than THRESHOLD.
+ALPHA = 0.01
+THRESHOLD = 0.05
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: float
+    current: float
+    p_value: float
+
+    @property
+    def change(self):
+        return self.current / self.baseline - 1
+
+    @property
+    def verdict(self):
+        if self.p_value >= ALPHA or abs(self.change) <= THRESHOLD:
+            return "same"
+        return "slower" if self.change > 0 else "faster"
+
+
+def compare(baseline, current):
+    # Both are {benchmark: [seconds, ...]}; only the common benchmarks
+    # are compared.
+    comparisons = []
+    for name, samples in current.items():
+        if name not in baseline:
+            continue
+        comparisons.append(
+            Comparison(
+                name,
+                statistics.median(baseline[name]),
+                statistics.median(samples),
+                mann_whitney(baseline[name], samples),
+            )
+        )
+    return comparisons
+
+
+def mann_whitney(first, second):
+    # Two-sided p-value of the Mann-Whitney U test, with the normal
+    # approximation (corrected for ties and continuity).  Timings are
+    # rarely normal, so this is safer than a t-test.
+    n1, n2 = len(first), len(second)
+    if not n1 or not n2:
+        return 1.0
+
+    values = sorted(
+        [(value, 0) for value in first] + [(value, 1) for value in second]
+    )
+    ranks = [0.0] * len(values)
+    ties = 0.0
+    start = 0
+    while start < len(values):
+        end = start
+        while end + 1 < len(values) and values[end + 1][0] == values[start][0]:
+            end += 1
+        for index in range(start, end + 1):
+            ranks[index] = (start + end) / 2 + 1
+        size = end - start + 1
+        ties += size ** 3 - size
+        start = end + 1
+
+    n = n1 + n2
+    u = sum(rank for rank, (_, group) in zip(ranks, values) if group == 0)
+    u -= n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return 2 * (1 - statistics.NormalDist().cdf(max(z, 0.0)))
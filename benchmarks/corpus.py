@@ -0,0 +1,119 @@
+import io
+import random
+import sysconfig
+from pathlib import Path
+
+from freesyntax.lib2to3 import pygram, pytree
+from freesyntax.lib2to3.pgen2 import tokenize
+from freesyntax.lib2to3.pgen2.driver import Driver
+
+# Number of top-level statements of the synthetic sources
+SIZES = {"small": 50, "medium": 1_000, "huge": 20_000}
+
+# Number of rules of the synthetic grammars
+GRAMMAR_SIZES = {"small": 20, "medium": 200, "huge": 2_000}
+
+# Real sources: stdlib modules that the vendored grammar can parse
+STDLIB_MODULES = [
+    "argparse.py",
+    "ast.py",
+    "dataclasses.py",
+    "difflib.py",
+    "inspect.py",
+    "pathlib.py",
+    "pydoc.py",
+    "subprocess.py",
+    "tarfile.py",
+    "typing.py",
+]
+
+_PLAIN = [
+    "import module_{i}\n",
+    "value_{i} = [item.attr_{i} for item in items if item is not None]\n",
+    "result_{i} = call_{i}(first, second[{i}], *args, key={i}, **kwargs)\n",
+    "class Class_{i}(Base):\n"
+    "    attribute = {i}\n"
+    "\n"
+    "    def method(self, argument, *, flag=False):\n"
+    "        # comment {i}\n"
+    "        if argument and not flag:\n"
+    "            return self.attribute + argument * {i}\n"
+    "        return None\n"
+    "\n",
+    "def function_{i}(a, b=2, *args, **kwargs):\n"
+    "    try:\n"
+    "        with open(a) as stream:\n"
+    "            data = stream.read()\n"
+    "    except OSError as error:\n"
+    "        raise ValueError(f'{{a}}: {{error}}')\n"
+    "    return {{key: value for key, value in kwargs.items()}}\n"
+    "\n",
+    "while counter_{i} < {i}:\n"
+    "    counter_{i} += 1\n",
+]
+
+# The same, in the dialect of benchmarks.dialect (define-style functions
+# and marked trailers), with no plain def statements.
+_DIALECT = [
+    "import module_{i}\n",
+    "value_{i} = [item.attr_{i} for item in items if item is not None]\n",
+    "module_{i} = package.module_{i}!.attribute\n",
+    "result_{i} = call_{i}(first, second[{i}], *args, key={i}, **kwargs)\n",
+    "define *function_{i}* (a, b=2, *args, **kwargs) ->\n"
+    "    value = os.path!.join(a, str(b))\n"
+    "    return value\n"
+    "\n",
+    "while counter_{i} < {i}:\n"
+    "    counter_{i} += 1\n",
+]
+
+
+def synthetic(size, dialect=False, seed=0):
+    templates = _DIALECT if dialect else _PLAIN
+    rng = random.Random(seed)
+    return "".join(
+        rng.choice(templates).format(i=i) for i in range(SIZES[size])
+    )
+
+
+def synthetic_grammar(size, width=16):
+    # A chain of rules, each with repetitions, optional parts and a wide
+    # alternative of keywords (many equivalent DFA states to merge).
+    count = GRAMMAR_SIZES[size]
+    rules = ["file_input: (rule_0 | NEWLINE)* ENDMARKER"]
+    for i in range(count):
+        nested = f"rule_{i + 1}" if i + 1 < count else "STRING"
+        words = " | ".join(f"'w{i}_{k}'" for k in range(width))
+        rules.append(
+            f"rule_{i}: 'a{i}' ({nested} | NAME)*"
+            f" ['b{i}' (NUMBER | STRING) (',' (NUMBER | STRING))* [',']]"
+            f" | 'c{i}' ('d{i}' | 'e{i}')+ 'f{i}'"
+            f" | 'g{i}' [{nested}] ({words}) [{nested}] 'h{i}'"
+        )
+    return "\n".join(rules) + "\n"
+
+
+def stdlib():
+    # Modules which are missing (or use syntax the grammar doesn't
+    # cover) are skipped, so the corpus only depends on the interpreter.
+    directory = Path(sysconfig.get_paths()["stdlib"])
+    sources = []
+    for name in STDLIB_MODULES:
+        try:
+            source = (directory / name).read_text(encoding="utf-8")
+        except OSError:
+            continue
+        if _parses(source):
+            sources.append(source)
+    return sources
+
+
+def _parses(source):
+    driver = Driver(pygram.python_grammar, convert=pytree.convert)
+    try:
+        driver.parse_tokens(
+            tokenize.generate_tokens(io.StringIO(source).readline)
+        )
+    except Exception:
+        return False
+    return True
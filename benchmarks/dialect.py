@@ -0,0 +1,60 @@
+from freesyntax.factory import RuleFactory
+from freesyntax.grammar import Match, Optional, Or, Rule, Token, Unit
+from freesyntax.structs import Call, Name, String
+
+# The rules of the README and of example2.py
+
+
+def add_mark_rules(factory):
+    factory.register_token("!", "MARK")
+
+    @factory.trailer(
+        Or[
+            Unit[Match["("], Optional[Rule["arglist"]], Match[")"],],
+            Unit[Match["["], Rule["subscriptlist"], Match["]"],],
+            Unit[Match["."], Token["NAME"],],
+        ],
+        Optional[Token["MARK"]],
+    )
+    def fix_trailer(trailer):
+        if trailer.children[-1].type == factory.tokens.MARK:
+            trailer.children[-1].remove()
+            start = trailer.parent.children.index(trailer)
+            children = trailer.parent.children[: start + 1]
+            for child in children[1:]:
+                child.remove()
+
+            import_module = "".join(map(str, children))
+            import_module = String(repr(import_module.strip()))
+            children[0].replace(Call(Name("__import__"), [import_module]))
+
+
+def add_define_rules(factory):
+    @factory.funcdef(
+        Match["define"],
+        Token["STAR"],
+        Token["NAME"],
+        Token["STAR"],
+        Rule["parameters"],
+        Token["RARROW"],
+        Rule["suite"],
+    )
+    def fixer(node):
+        node.children[0].value = "def "
+        node.children[1].remove()
+        node.children[2].remove()
+        node.children[-2].replace(factory.tokens.leaf("COLON"))
+
+
+def mark_factory(**options):
+    factory = RuleFactory(**options)
+    add_mark_rules(factory)
+    return factory
+
+
+def dialect_factory(**options):
+    factory = RuleFactory(**options)
+    with factory.batch():
+        add_mark_rules(factory)
+        add_define_rules(factory)
+    return factory
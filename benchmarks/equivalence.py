@@ -0,0 +1,165 @@
+import argparse
+import io
+import random
+import sys
+
+from benchmarks import corpus
+from benchmarks.dialect import dialect_factory
+from freesyntax.lib2to3 import pygram, pytree
+from freesyntax.lib2to3.pgen2 import codegen, parse, tables, tokenize
+from freesyntax.lib2to3.pgen2.driver import Driver
+
+# Checks that the parsers build the same trees (and fail with the same
+# errors) as the DFA walking parser of lib2to3, on the corpora and on
+# copies of them with a character dropped here and there.
+
+
+class ReferenceParser(parse.Parser):
+    # The parser of lib2to3, which walks the arcs of the DFAs and tests
+    # the first sets of the symbols on them for every token.
+
+    def setup(self, start=None):
+        # Its frames have the DFAs of the symbols
+        super().setup(start)
+        states, state, node = self.stack[0]
+        self.stack[0] = (self.grammar.dfas[node[0]], state, node)
+
+    def addtoken(self, type, value, context):
+        ilabel = self.classify(type, value, context)
+        while True:
+            dfa, state, node = self.stack[-1]
+            states, first = dfa
+            arcs = states[state]
+            for i, newstate in arcs:
+                t, v = self.grammar.labels[i]
+                if ilabel == i:
+                    self.shift(type, value, newstate, context)
+                    state = newstate
+                    while states[state] == [(0, state)]:
+                        self.pop()
+                        if not self.stack:
+                            return True
+                        dfa, state, node = self.stack[-1]
+                        states, first = dfa
+                    return False
+                elif t >= 256:
+                    itsdfa = self.grammar.dfas[t]
+                    itsstates, itsfirst = itsdfa
+                    if ilabel in itsfirst:
+                        self.push(t, itsdfa, newstate, context)
+                        break
+            else:
+                if (0, state) in arcs:
+                    self.pop()
+                    if not self.stack:
+                        raise parse.ParseError(
+                            "too much input", type, value, context
+                        )
+                else:
+                    raise parse.ParseError("bad input", type, value, context)
+
+
+# The parsers checked, as the grammar and the options of their drivers
+PARSERS = {
+    "tables": lambda grammar: {},
+    "collapsing": lambda grammar: {"collapse": True},
+    "mapped": lambda grammar: {"grammar": _mapped(grammar)},
+    "mapped collapsing": lambda grammar: {
+        "grammar": _mapped(grammar),
+        "collapse": True,
+    },
+    "compiled": lambda grammar: {
+        "parser": codegen.load(codegen.generate(grammar)).Parser
+    },
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.equivalence",
+        description="Check that the parsers agree with the lib2to3 one.",
+    )
+    parser.add_argument(
+        "-m",
+        "--mutations",
+        type=int,
+        default=5,
+        help="corrupted copies of each source",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args(argv)
+
+    rng = random.Random(options.seed)
+    failures = 0
+    for name, grammar, generate_tokens, sources in _corpora():
+        drivers = {
+            parser_name: _driver(grammar, make_options(grammar))
+            for parser_name, make_options in PARSERS.items()
+        }
+        reference = Driver(
+            grammar, convert=pytree.convert, parser=ReferenceParser
+        )
+        checked = 0
+        for index, source in enumerate(sources):
+            variants = [("", source)]
+            for _ in range(options.mutations):
+                position = rng.randrange(len(source))
+                variants.append(
+                    (
+                        f", without the character at {position}",
+                        source[:position] + source[position + 1 :],
+                    )
+                )
+            for description, variant in variants:
+                expected = _result(reference, generate_tokens, variant)
+                for parser_name, driver in drivers.items():
+                    checked += 1
+                    result = _result(driver, generate_tokens, variant)
+                    if result != expected:
+                        failures += 1
+                        print(
+                            f"{parser_name} differs on {name} source"
+                            f" {index}{description}"
+                        )
+        print(f"{name}: {checked} parses checked", flush=True)
+    return 1 if failures else 0
+
+
+def _corpora():
+    # (name, grammar, tokenizer, sources)
+    stock = pygram.python_grammar, tokenize.generate_tokens
+    yield ("stdlib", *stock, corpus.stdlib())
+    yield ("synthetic", *stock, [corpus.synthetic("medium")])
+    factory = dialect_factory()
+    dialect = factory.rule_grammar.grammar, factory.tokens.generate_tokens
+    yield ("dialect", *dialect, [corpus.synthetic("medium", dialect=True)])
+
+
+def _mapped(grammar):
+    # A view of the grammar in the binary format
+    return tables.loads(tables.dumps(grammar))
+
+
+def _driver(grammar, options):
+    # The options might give the grammar (the tables) to parse with
+    grammar = options.pop("grammar", grammar)
+    return Driver(grammar, convert=pytree.convert, **options)
+
+
+def _result(driver, generate_tokens, source):
+    readline = io.StringIO(source).readline
+    try:
+        tree = driver.parse_tokens(generate_tokens(readline))
+    except (parse.ParseError, tokenize.TokenError, IndentationError) as error:
+        return type(error).__name__, str(error)
+    return _shape(tree)
+
+
+def _shape(node):
+    if isinstance(node, pytree.Leaf):
+        return node.type, node.value, node.prefix
+    return node.type, [_shape(child) for child in node.children]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import functools
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from benchmarks import corpus
+from benchmarks.dialect import dialect_factory, mark_factory
+from freesyntax.factory import GRAMMAR, RuleFactory
+from freesyntax.lib2to3 import pygram, pytree
+from freesyntax.lib2to3.pgen2 import codegen, tokenize
+from freesyntax.lib2to3.pgen2.driver import Driver
+from freesyntax.lib2to3.pgen2.pgen import generate_grammar
+
+# A sample runs the benchmark in a loop for at least this long
+MIN_SAMPLE_TIME = 0.05
+
+_IMPORT_SCRIPT = """\
+import time
+start = time.perf_counter()
+import freesyntax.factory
+print(time.perf_counter() - start)
+"""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # Prepares everything and returns the function to time
+    setup: Callable[[], Callable[[], object]]
+    # The function reports its own time (e.g. in a subprocess)
+    self_timed: bool = False
+
+    def run(self, samples):
+        func = self.setup()
+        if self.self_timed:
+            return [func() for _ in range(samples)]
+
+        # Warm up, and find out how many calls make a sample
+        loops = 1
+        while True:
+            elapsed = _time(func, loops)
+            if elapsed >= MIN_SAMPLE_TIME:
+                break
+            loops *= 2
+        return [_time(func, loops) / loops for _ in range(samples)]
+
+
+def _time(func, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+
+def benchmarks(sizes):
+    yield Benchmark("import", _import, self_timed=True)
+    yield Benchmark("factory", lambda: RuleFactory)
+    yield Benchmark("factory[cached]", _cached_factory)
+    yield Benchmark("pgen", lambda: functools.partial(_pgen, GRAMMAR))
+    for size in sizes:
+        yield Benchmark(
+            f"pgen[synthetic-{size}]", functools.partial(_grammar, size)
+        )
+    for name in [f"synthetic-{size}" for size in sizes] + ["stdlib"]:
+        yield Benchmark(
+            f"tokenize[{name}]", functools.partial(_tokenize, name)
+        )
+        yield Benchmark(f"parse[{name}]", functools.partial(_parse, name))
+        yield Benchmark(
+            f"parse[{name}, compiled]",
+            functools.partial(_parse, name, compiled=True),
+        )
+        yield Benchmark(f"str[{name}]", functools.partial(_str, name))
+        yield Benchmark(
+            f"transform[{name}]", functools.partial(_transform, name)
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def _sources(name, dialect=False):
+    if name == "stdlib":
+        return corpus.stdlib()
+    size = name.partition("-")[2]
+    return [corpus.synthetic(size, dialect=dialect)]
+
+
+def _import():
+    # In a fresh interpreter each time, with this very package
+    root = Path(__file__).resolve().parent.parent
+    environment = dict(os.environ, PYTHONPATH=str(root))
+
+    def run():
+        result = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT],
+            env=environment,
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        return float(result.stdout)
+
+    return run
+
+
+def _cached_factory():
+    directory = tempfile.mkdtemp(prefix="freesyntax-benchmarks-")
+    RuleFactory(cache_dir=directory)
+    return functools.partial(RuleFactory, cache_dir=directory)
+
+
+def _pgen(path):
+    generate_grammar(path.read_text())
+
+
+def _grammar(size):
+    source = corpus.synthetic_grammar(size)
+    return functools.partial(generate_grammar, source)
+
+
+def _tokenize(name):
+    sources = _sources(name)
+
+    def run():
+        for source in sources:
+            for _ in tokenize.generate_tokens(io.StringIO(source).readline):
+                pass
+
+    return run
+
+
+def _parse(name, compiled=False):
+    sources = _sources(name)
+    parser = None
+    if compiled:
+        source = codegen.generate(pygram.python_grammar)
+        parser = codegen.load(source).Parser
+    driver = Driver(
+        pygram.python_grammar, convert=pytree.convert, parser=parser
+    )
+
+    def run():
+        for source in sources:
+            driver.parse_string(source)
+
+    return run
+
+
+def _str(name):
+    driver = Driver(pygram.python_grammar, convert=pytree.convert)
+    trees = [driver.parse_string(source) for source in _sources(name)]
+
+    def run():
+        for tree in trees:
+            str(tree)
+
+    return run
+
+
+def _transform(name):
+    # The synthetic sources are written in the dialect of the README and
+    # example2.py rules, the stdlib ones only go through the latter.
+    if name == "stdlib":
+        factory, sources = mark_factory(), _sources(name)
+    else:
+        factory, sources = dialect_factory(), _sources(name, dialect=True)
+
+    def run():
+        for source in sources:
+            factory.transform(source)
+
+    return run
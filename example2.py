@@ -7,7 +7,6 @@ from freesyntax.structs import (
     Node,
     String,
     Symbols,
-    Tokens,
 )
 
 factory = RuleFactory()
@@ -23,7 +22,7 @@ factory.register_token("!", "MARK")
     Optional[Token["MARK"]],
 )
 def fix_trailer(trailer):
-    if trailer.children[-1].type == Tokens.MARK:
+    if trailer.children[-1].type == factory.tokens.MARK:
         trailer.children[-1].remove()
         start = trailer.parent.children.index(trailer)
         children = trailer.parent.children[: start + 1]
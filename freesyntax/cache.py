@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+
+CACHE_ENV = "FREESYNTAX_CACHE_DIR"
+CACHE_VERSION = 4
+
+
+def fingerprint(*parts):
+    hasher = hashlib.sha256()
+    hasher.update(f"{CACHE_VERSION}:{sys.version_info[:2]}".encode())
+    for part in parts:
+        hasher.update(b"\0")
+        hasher.update(repr(part).encode())
+    return hasher.hexdigest()
+
+
+def write_atomic(path, data):
+    # Write into a private temporary file and atomically move it into
+    # place, so concurrent writers never expose a partial file (the
+    # last rename wins, and all of them are identical).
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=".tmp-"
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as stream:
+            stream.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(temporary)
+        raise
+
+
+@dataclass
+class DiskCache:
+    directory: Path
+
+    def __post_init__(self):
+        self.directory = Path(self.directory)
+
+    @classmethod
+    def from_env(cls):
+        if directory := os.environ.get(CACHE_ENV):
+            return cls(directory)
+
+    def path_for(self, key):
+        return self.directory / key[:2] / key
+
+    def read(self, key):
+        try:
+            return self.path_for(key).read_bytes()
+        except OSError:
+            return None
+
+    def write(self, key, data):
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+        return path
+
+    def entries(self):
+        for path in self.directory.glob("??/*"):
+            if not path.name.startswith(".tmp-"):
+                yield path
+
+
+class ResultCache:
+    # Transformed sources, keyed by the factory fingerprint and source.
+    # Recently used results are kept in memory (up to maxsize entries);
+    # with a directory they are also written there, and the least
+    # recently used files are evicted once they exceed max_bytes.
+
+    def __init__(self, maxsize=256, directory=None, max_bytes=64 * 2 ** 20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.disk = None if directory is None else DiskCache(directory)
+        self._disk_usage = None
+
+    def __getstate__(self):
+        # Copies (e.g. the ones sent to worker processes) start with an
+        # empty memory tier, the disk one is shared.
+        state = self.__dict__.copy()
+        state["memory"] = OrderedDict()
+        return state
+
+    @staticmethod
+    def key(factory_fingerprint, source):
+        hasher = hashlib.sha256(factory_fingerprint.encode())
+        hasher.update(b"\0")
+        hasher.update(source.encode("utf-8", "surrogatepass"))
+        return hasher.hexdigest()
+
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        if self.disk is None or (data := self.disk.read(key)) is None:
+            return None
+
+        # Mark the entry as recently used for the eviction
+        with suppress(OSError):
+            os.utime(self.disk.path_for(key))
+        result = data.decode("utf-8", "surrogatepass")
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        self._remember(key, result)
+        if self.disk is None:
+            return
+
+        data = result.encode("utf-8", "surrogatepass")
+        self.disk.write(key, data)
+        if self._disk_usage is None:
+            self._disk_usage = self._scan_disk_usage()
+        else:
+            self._disk_usage += len(data)
+        if self._disk_usage > self.max_bytes:
+            self._evict()
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            for path in self.disk.entries():
+                with suppress(OSError):
+                    path.unlink()
+            self._disk_usage = 0
+
+    def _remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def _scan_disk_usage(self):
+        usage = 0
+        for path in self.disk.entries():
+            with suppress(OSError):
+                usage += path.stat().st_size
+        return usage
+
+    def _evict(self):
+        # Other processes might share the directory, so re-scan it and
+        # drop the oldest entries until there is some room left again.
+        entries = []
+        for path in self.disk.entries():
+            with suppress(OSError):
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        usage = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if usage <= target:
+                break
+            with suppress(OSError):
+                path.unlink()
+                usage -= size
+        self._disk_usage = usage
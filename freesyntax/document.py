@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import bisect
+import io
+import re
+from dataclasses import dataclass
+from typing import List
+
+from freesyntax.lib2to3 import pytree
+from freesyntax.lib2to3.pgen2 import tokenize as _tokenize
+from freesyntax.lib2to3.pgen2.parse import ParseError
+
+
+@dataclass
+class Segment:
+    source: str
+    nodes: List[pytree.Base]
+    output: str
+
+
+class _Unclean(Exception):
+    pass
+
+
+class Document:
+    # A transformed source that can be edited in place. The source is
+    # kept in segments of complete top-level statements (along with the
+    # transformed nodes and text of each), so an edit only re-parses and
+    # re-transforms the segments it touches, and splices their new nodes
+    # into the tree.
+
+    def __init__(self, factory, source):
+        self.factory = factory
+        self.source = source
+        self.segments = None
+        self.tree = None
+        self._rebuild()
+
+    @property
+    def output(self):
+        if self.segments is None:
+            self._rebuild()
+        return "".join(segment.output for segment in self.segments)
+
+    def edit(self, start, end, text):
+        # Replace source[start:end] with text, and return the new output.
+        # If the edited source can't be parsed, the error is raised but
+        # the edit is still kept; the next one re-parses everything.
+        if not 0 <= start <= end <= len(self.source):
+            raise IndexError(f"invalid edit span: {start}:{end}")
+        self.source = self.source[:start] + text + self.source[end:]
+        if self.segments is None:
+            self._rebuild()
+            return self.output
+
+        offsets = [0]
+        for segment in self.segments:
+            offsets.append(offsets[-1] + len(segment.source))
+        first = max(bisect.bisect_right(offsets, start) - 1, 0)
+        last = max(bisect.bisect_right(offsets, max(end - 1, start)) - 1, 0)
+        first = min(first, len(self.segments) - 1)
+        last = min(max(last, first), len(self.segments) - 1)
+        delta = len(text) - (end - start)
+
+        # Widen the span until the new text parses on its own, and ends
+        # on a statement boundary (so the segments after it are intact);
+        # doubling the widening keeps invalid edits from getting slow.
+        widen = 1
+        while True:
+            at_end = last == len(self.segments) - 1
+            region = self.source[offsets[first] : offsets[last + 1] + delta]
+            try:
+                segments = self._parse(region, at_end)
+            except _Unclean:
+                last += 1
+            except (ParseError, _tokenize.TokenError, SyntaxError):
+                if first == 0 and at_end:
+                    self.segments = self.tree = None
+                    raise
+                first = max(first - widen, 0)
+                last = min(last + widen, len(self.segments) - 1)
+                widen *= 2
+            else:
+                break
+
+        lower = sum(len(segment.nodes) for segment in self.segments[:first])
+        upper = lower + sum(
+            len(segment.nodes) for segment in self.segments[first : last + 1]
+        )
+        nodes = [node for segment in segments for node in segment.nodes]
+        for node in self.tree.children[lower:upper]:
+            node.parent = None
+        for node in nodes:
+            node.parent = self.tree
+        self.tree.children[lower:upper] = nodes
+        self.tree.changed()
+        self.segments[first : last + 1] = segments
+        return self.output
+
+    def _rebuild(self):
+        try:
+            self.segments = self._parse(self.source, at_end=True)
+        except BaseException:
+            self.segments = self.tree = None
+            raise
+        grammar = self.factory.pgen2_driver.grammar
+        self.tree = pytree.Node(
+            grammar.start,
+            [node for segment in self.segments for node in segment.nodes],
+        )
+
+    def _parse(self, source, at_end):
+        lines = [0]
+        lines.extend(match.end() for match in re.finditer("\n", source))
+        tokens = self.factory.tokens.generate_tokens(
+            io.StringIO(source).readline
+        )
+
+        segments = []
+        position = 0
+        for chunk, context in self.factory._chunks(tokens):
+            if context is None:
+                boundary = len(source)
+                if not at_end:
+                    # Text after the last statement (comments, or a line
+                    # without a newline) belongs to the next segment.
+                    endmarker = chunk.children[-1]
+                    if endmarker.prefix or source[-1:] not in ("", "\n"):
+                        raise _Unclean
+                    endmarker.remove()
+            else:
+                prefix, (lineno, column) = context
+                boundary = lines[lineno - 1] + column - len(prefix)
+
+            if not chunk.children and position == boundary:
+                continue
+            output = str(chunk)
+            nodes = chunk.children
+            chunk.children = []
+            for node in nodes:
+                node.parent = None
+            segments.append(Segment(source[position:boundary], nodes, output))
+            position = boundary
+        return segments
@@ -1,23 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import io
+import itertools
+import marshal
+import os
 import re
-import token
-import tokenize
+import types
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager, suppress
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Mapping, Optional
 
-from freesyntax.grammar import _GrammarRepresentative
+from freesyntax.cache import DiskCache, fingerprint
+from freesyntax.document import Document
+from freesyntax.grammar import (
+    _GrammarRepresentative,
+    rule_tokens,
+    token_names,
+)
 from freesyntax.lib2to3 import pygram, pytree
-from freesyntax.lib2to3.pgen2 import grammar as _grammar
-from freesyntax.lib2to3.pgen2 import token as _token
-from freesyntax.lib2to3.pgen2 import tokenize as _tokenize
-from freesyntax.lib2to3.pgen2.driver import Driver
-from freesyntax.lib2to3.pgen2.pgen import generate_grammar
-from freesyntax.parser import parse_rule
-from freesyntax.shortcuts import get_tokens
-from freesyntax.structs import Symbols
+from freesyntax.lib2to3.pgen2 import codegen, tables
+from freesyntax.lib2to3.pgen2.driver import Driver, run_steps
+from freesyntax.lib2to3.pgen2.pgen import ParserGenerator
+from freesyntax.parser import LazyRules, split_rules
+from freesyntax.registry import TokenRegistry
+from freesyntax.stats import TransformStats
+from freesyntax.structs import bound_factory
 
 GRAMMAR = Path(__file__).parent / "lib2to3" / "Grammar.txt"
 
@@ -26,133 +37,824 @@ GRAMMAR = Path(__file__).parent / "lib2to3" / "Grammar.txt"
 class RuleGrammar:
     raw_grammar: str
     rules: Dict[str, str] = field(default_factory=dict)
-    pyrules: Dict[str, _GrammarRepresentative] = field(default_factory=dict)
+    pyrules: Mapping[str, _GrammarRepresentative] = field(
+        default_factory=dict
+    )
+    cache: Optional[DiskCache] = field(
+        default=None, repr=False, compare=False
+    )
+    tokens: TokenRegistry = field(
+        default_factory=TokenRegistry, repr=False, compare=False
+    )
 
     def __post_init__(self):
-        tokens = get_tokens(self.raw_grammar)
-
-        buffer = []
-        name = None
-
-        def reset_lines(tokens):
-            first_line = tokens[0][2][0] - 1
-            first_col = tokens[0][2][1]
-            new_tokens = []
-            current_line = 1
-            for current_token in tokens:
-                token_type, value, start, end, line = current_token
-                start = (start[0] - first_line, start[1] - first_col)
-                end = (end[0] - first_line, end[1] - first_col)
-                new_tokens.append((token_type, value, start, end, line))
-
-            return new_tokens
-
-        def add_rule():
-            rule_text = tokenize.untokenize(reset_lines(buffer[:-1]))
-            rule_text = rule_text.replace("\\", str())
-            self.pyrules[name] = parse_rule(rule_text)
-            self.rules[name] = rule_text.split()
-
-        for current_token in tokens:
-            if current_token[0] in {token.COMMENT, token.NEWLINE}:
-                continue
-            if current_token[0] == token.NL:
-                continue
+        self.generator = None
+        self._parser = None
+        self.parse_rules()
+        self.regen_grammar()
 
-            if len(buffer) > 1 and current_token[1] == ":":
-                add_rule()
-                name = buffer[-1]
-                buffer.clear()
-                buffer.append(name)
+    def __getstate__(self):
+        # The generator holds a live tokenizer, which can't be pickled;
+        # it will be rebuilt on the next regeneration.  Neither can the
+        # generated parser, which is loaded again when it is used.
+        state = self.__dict__.copy()
+        state["generator"] = None
+        state["_parser"] = None
+        return state
 
-            if len(buffer) == 1 and current_token[1] == ":":
-                name = buffer.pop()[1]
-            else:
-                buffer.append(current_token)
-        else:
-            add_rule()
-
-        self.regen_grammar()
+    def parse_rules(self):
+        # Only sliced out of the grammar file here, the representatives
+        # are parsed when they are first looked up.
+        texts = split_rules(self.raw_grammar)
+        self.rules = dict(texts)
+        self.pyrules = LazyRules(texts)
 
-    def _prepare_grammar(self):
+    def _prepare_grammar(self, names=None):
         rule_texts = []
         for name, rule in self.rules.items():
-            rule_text = " ".join(map(str, rule))
+            if names is not None and name not in names:
+                continue
+            if isinstance(rule, str):
+                rule_text = rule
+            else:
+                rule_text = " ".join(map(str, rule))
             rule_texts.append(f"{name}:{rule_text}")
         return "\n".join(rule_texts) + "\n"
 
-    def regen_grammar(self):
-        self.grammar = generate_grammar(self._prepare_grammar())
+    def regen_grammar(self, changed=frozenset()):
+        if self.cache is None:
+            self.grammar = self._generate_grammar(changed)
+        else:
+            self.grammar = self._load_grammar(self._prepare_grammar(), changed)
+        # Registering a token later on has to reach the grammar as well
+        self.grammar.opmap = self.tokens.opmap
         self.symbols = pygram.Symbols(self.grammar)
         return self.grammar
 
+    def _generate_grammar(self, changed, source=None):
+        if changed and self.generator is not None:
+            # Straight from the representatives, no text in between
+            rules = {
+                name: rule
+                for name, rule in self.rules.items()
+                if name in changed
+            }
+            try:
+                stale = self.generator.update_tokens(rule_tokens(rules))
+            except BaseException:
+                # The generator might be half-updated, start over next time
+                self.generator = None
+                raise
+            return self.generator.update_grammar(self.grammar, changed, stale)
+
+        self.generator = ParserGenerator(
+            source or self._prepare_grammar(),
+            self.tokens.opmap,
+            self.tokens.tok_name,
+        )
+        return self.generator.make_grammar()
+
+    def _load_grammar(self, source, changed):
+        # Token numbers of the registered tokens are baked into the
+        # generated labels, so they are a part of the key as well.
+        key = fingerprint(
+            "grammar",
+            source,
+            sorted(self.tokens.tok_name.items()),
+            sorted(self.tokens.opmap.items()),
+        )
+        try:
+            # Mapped in place, so the processes using the cache share
+            # the pages of the tables.
+            grammar = tables.load(self.cache.path_for(key))
+        except (OSError, ValueError):
+            grammar = self._generate_grammar(changed, source)
+            self.cache.write(key, tables.dumps(grammar))
+        else:
+            # The generator no longer matches the current grammar
+            self.generator = None
+        return grammar
+
+    def compiled_parser(self):
+        # The Parser generated for the current grammar (see codegen)
+        if self._parser is None or self._parser[0] is not self.grammar:
+            self._parser = self.grammar, self._load_parser()
+        return self._parser[1]
+
+    def _load_parser(self):
+        # Compiled once per grammar and kept as bytecode in the cache;
+        # the labels are baked into the code, so the tables are the key.
+        key = fingerprint(
+            "parser", codegen.VERSION, tables.dumps(self.grammar)
+        )
+        data = None if self.cache is None else self.cache.read(key)
+        try:
+            code = marshal.loads(data)
+        except (TypeError, ValueError, EOFError):
+            source = codegen.generate(self.grammar)
+            code = compile(source, "<parser>", "exec")
+            if self.cache is not None:
+                self.cache.write(key, marshal.dumps(code))
+        return codegen.load(code).Parser
+
+
+def _code_identity(func):
+    if code := getattr(func, "__code__", None):
+        return hashlib.sha256(repr(_canonical(code)).encode()).hexdigest()
+    # Not a plain function (e.g. a partial), nothing stable to hash
+    return repr(func)
+
+
+def _canonical(value):
+    # What a code object does, as plain values; marshal's output depends
+    # on interning and reference counts, so it differs between a module
+    # compiled from source and the same one loaded from its .pyc
+    if isinstance(value, types.CodeType):
+        return (
+            value.co_code,
+            value.co_names,
+            value.co_varnames,
+            value.co_freevars,
+            _canonical(value.co_consts),
+        )
+    if isinstance(value, tuple):
+        return tuple(map(_canonical, value))
+    if isinstance(value, frozenset):
+        # Iterated in the order of the (randomized) string hashes
+        return frozenset, sorted(map(repr, map(_canonical, value)))
+    return value
+
+
+def _requiring(grammar, labels):
+    # The symbols which can't match without a token of the given labels:
+    # with the arcs of those dropped, as well as the arcs of the symbols
+    # found so far, no final state of their DFA can be reached.
+    required = set(grammar.number2symbol)
+    changed = True
+    while changed:
+        changed = False
+        for symbol in list(required):
+            states, _ = grammar.dfas[symbol]
+            seen, pending = {0}, [0]
+            while pending:
+                state = pending.pop()
+                for label, next in states[state]:
+                    if label in labels:
+                        continue
+                    if grammar.labels[label][0] in required:
+                        continue
+                    if label == 0 and next == state:
+                        # A final state
+                        required.discard(symbol)
+                        changed = True
+                        pending.clear()
+                        break
+                    if next not in seen:
+                        seen.add(next)
+                        pending.append(next)
+    return required
+
+
+def _pre_order(indexed):
+    # Nodes are reduced bottom-up; ordering them by their starting
+    # position, outer ones (reduced later) first, gives pre-order.
+    indexed.sort(key=lambda item: item[:2])
+    return [node for position, order, node in indexed]
+
+
+def _changed_nodes(tree, types):
+    # The nodes of the given types that are new (not checked yet) or have
+    # a changed subtree, in pre-order; marks every visited node as seen.
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node.was_checked and not node.was_changed:
+            continue
+        if node.was_changed:
+            # No longer matches its span of the source (see
+            # _splice_output), even after the flag is reset.
+            node.parsed = False
+        node.was_checked = True
+        node.was_changed = False
+        if node.type in types:
+            yield node
+        stack.extend(reversed(node.children))
+
+
+def _settle(node, fresh):
+    # After the transformer of node returned None: what it changed in
+    # place counts as seen, so its own output doesn't queue it again
+    # (its ancestors stay changed); the new nodes in it are collected
+    # in fresh instead, to be queued on their own.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, pytree.Leaf):
+            continue
+        if not node.was_checked:
+            fresh.append(node)
+        elif node.was_changed:
+            node.parsed = False
+            node.was_changed = False
+            stack.extend(node.children)
+
+
+def _touch(node):
+    # Marks the ancestors of a node that an eager transformer changed or
+    # returned, once it has them
+    if node.parent is not None:
+        node.parent.changed()
+
+
+class _ParsedNode(pytree.Node):
+    # A node made by the parser, which (while it isn't changed) matches
+    # its span of the source
+    parsed = True
+
+
+def _splice_output(tree, source):
+    # Serialize only the changed parts of the tree; the parsed subtrees
+    # which haven't changed (all of their leaves still have the original
+    # positions) are copied from the source.
+    lines = None
+    output = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, pytree.Leaf):
+            output.append(node.prefix)
+            output.append(node.value)
+        elif node.was_changed or not getattr(node, "parsed", False):
+            stack.extend(reversed(node.children))
+        else:
+            if lines is None:
+                lines = [0]
+                lines.extend(m.end() for m in re.finditer("\n", source))
+            first = last = node
+            while first.children:
+                first = first.children[0]
+            while last.children:
+                last = last.children[-1]
+            if last.lineno > len(lines):
+                # The last DEDENT, after a comment without a newline at
+                # the end: the tokenizer added the newline to its prefix,
+                # so it has no span in the source.
+                stack.extend(reversed(node.children))
+                continue
+            start = lines[first.lineno - 1] + first.column - len(first.prefix)
+            end = lines[last.lineno - 1] + last.column + len(last.value)
+            output.append(source[start:end])
+    return "".join(output)
+
+
+def _is_attached(node, root):
+    while node.parent is not None:
+        node = node.parent
+    return node is root
+
 
 @dataclass
 class RuleProxy:
     rule: str
     factory: RuleFactory
 
-    def __call__(self, *items):
+    def __call__(self, *items, eager=False):
+        # Eager transformers run as soon as the parser reduces a node of
+        # their rule; they see the complete subtree but not its parent,
+        # and a returned node replaces the reduced one.
         def wrapper(func):
             self.factory.transformers[self.rule] = func
+            if eager:
+                self.factory.eager_rules.add(self.rule)
+            else:
+                self.factory.eager_rules.discard(self.rule)
             return func
 
         if len(items) == 1 and callable(items[0]):
             return wrapper(*items)
-        else:
+        elif items:
             self.factory.notify(self.rule, items)
-            return wrapper
+        return wrapper
 
 
 class RuleFactory:
-    def __init__(self):
+    def __init__(
+        self,
+        cache_dir=None,
+        prefilter=False,
+        result_cache=None,
+        fixpoint=False,
+        max_rounds=100,
+        minimal_output=False,
+        profile=False,
+        compiled_parser=False,
+    ):
+        if cache_dir is None:
+            cache = DiskCache.from_env()
+        else:
+            cache = DiskCache(cache_dir)
+
         self.transformers = {}
-        self.rule_grammar = RuleGrammar(GRAMMAR.read_text())
+        self.eager_rules = set()
+        self.custom_rules = set()
+        self.tokens = TokenRegistry()
+        self.prefilter = prefilter
+        self.result_cache = result_cache
+        self.fixpoint = fixpoint
+        self.max_rounds = max_rounds
+        self.minimal_output = minimal_output
+        self.profile = TransformStats() if profile else None
+        self.compiled_parser = compiled_parser
+        self._trigger_cache = None
+        self._fingerprint_cache = None
+        self.pending_rules = set()
+        self.batching = False
+        self.rule_grammar = RuleGrammar(
+            GRAMMAR.read_text(), cache=cache, tokens=self.tokens
+        )
         self.pgen2_driver = Driver(
-            grammar=self.rule_grammar.grammar, convert=pytree.convert
+            grammar=self.rule_grammar.grammar,
+            convert=pytree.convert,
+            collapse=True,
         )
 
     def __getattr__(self, rule):
-        if rule in self.rule_grammar.grammar.symbol2number:
+        # Look at the __dict__ directly, this might be called while the
+        # instance is still being initialized (or unpickled).
+        rule_grammar = self.__dict__.get("rule_grammar")
+        if rule_grammar and rule in rule_grammar.grammar.symbol2number:
             return RuleProxy(rule, self)
         raise AttributeError(rule)
 
+    def __getstate__(self):
+        self.freeze()
+        state = self.__dict__.copy()
+        state["_trigger_cache"] = None
+        state["_fingerprint_cache"] = None
+        return state
+
     def notify(self, rule_name, rule_value):
+        for token_name in token_names(rule_value):
+            if token_name not in self.tokens.numbers:
+                raise ValueError(f"Unknown token, {token_name}!")
         self.transformers.pop(rule_name, None)
+        self.eager_rules.discard(rule_name)
         # when changing the rule, ensure the transformers are obsolete
         self.rule_grammar.rules[rule_name] = rule_value
-        self.pgen2_driver.grammar = self.rule_grammar.regen_grammar()
-        self.bind_syms()
+        self.pending_rules.add(rule_name)
+        self.custom_rules.add(rule_name)
+        if not self.batching:
+            self.freeze()
+
+    @contextmanager
+    def batch(self):
+        # Collect all rule overrides made inside the block, and generate
+        # the grammar only once, when leaving it.
+        if self.batching:
+            yield self
+            return
+
+        self.batching = True
+        try:
+            yield self
+        finally:
+            self.batching = False
+            self.freeze()
+
+    def freeze(self):
+        if not self.pending_rules:
+            return
+
+        changed, self.pending_rules = self.pending_rules, set()
+        self.pgen2_driver.grammar = self.rule_grammar.regen_grammar(
+            changed=changed
+        )
 
-    def bind_syms(self):
-        Symbols.factory = self
+    @contextmanager
+    def bound(self):
+        # Makes this factory the one behind the module level Symbols,
+        # Tokens and AutoLeaf, for the current thread (or task) inside
+        # the block.  The transformers run with their factory bound.
+        reset = bound_factory.set(self)
+        try:
+            yield self
+        finally:
+            bound_factory.reset(reset)
+
+    @property
+    def symbols(self):
+        self.freeze()
+        return self.rule_grammar.symbols
 
     def transform(self, source):
-        tree = self.pgen2_driver.parse_string(source)
-        for node in tree.pre_order():
-            if isinstance(node, pytree.Leaf):
-                continue
-            node_type = self.rule_grammar.grammar.number2symbol[node.type]
-            if transformer := self.transformers.get(node_type):
-                if new := transformer(node):
-                    node.replace(new)
+        with self.bound():
+            return run_steps(self._transform_steps(source))
+
+    async def transform_async(self, source, executor=None, step=None):
+        # Without a step, run transform() on the given (or the default)
+        # executor.  Otherwise parse on the event loop itself, yielding
+        # to it after every step tokens.
+        if step is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor, self.transform, source
+            )
+
+        # Only the steps run with this factory bound, not the other tasks
+        steps = self._transform_steps(source, step)
+        while True:
+            try:
+                with self.bound():
+                    next(steps)
+            except StopIteration as stop:
+                return stop.value
+            await asyncio.sleep(0)
+
+    def _transform_steps(self, source, step=None):
+        self.freeze()
+        if self.result_cache is None:
+            return (yield from self._transform(source, step))
+
+        key = self.result_cache.key(self.fingerprint(), source)
+        if (result := self.result_cache.get(key)) is None:
+            result = yield from self._transform(source, step)
+            self.result_cache.put(key, result)
+        return result
+
+    def fingerprint(self):
+        # Identifies everything that the output of transform() depends
+        # on: the rules, the registered tokens and the transformers'
+        # code. Values captured by closures or read from globals are
+        # not covered.
+        self.freeze()
+        key = (
+            self.rule_grammar.grammar,
+            tuple(self.transformers.items()),
+            frozenset(self.eager_rules),
+            frozenset(self.tokens.opmap.items()),
+            self.prefilter,
+            self.fixpoint,
+            self.max_rounds,
+            self.minimal_output,
+        )
+        if self._fingerprint_cache is None or (
+            self._fingerprint_cache[0] != key
+        ):
+            transformers = sorted(
+                (rule, rule in self.eager_rules, _code_identity(transformer))
+                for rule, transformer in self.transformers.items()
+            )
+            self._fingerprint_cache = key, fingerprint(
+                "factory",
+                self.rule_grammar._prepare_grammar(),
+                sorted(self.tokens.tok_name.items()),
+                sorted(self.tokens.opmap.items()),
+                transformers,
+                self.prefilter,
+                self.fixpoint,
+                self.max_rounds,
+                self.minimal_output,
+            )
+        return self._fingerprint_cache[1]
+
+    def _transform(self, source, step=None):
+        if self.prefilter and not self._may_trigger(source):
+            return source
+
+        dispatch, eager = self._dispatch_tables()
+        tree, nodes, fresh = yield from self._parse(
+            source, dispatch.keys(), eager, step
+        )
+        self._apply(tree, nodes, dispatch, fresh)
+        if self.minimal_output:
+            return _splice_output(tree, source)
         return str(tree)
 
+    def transform_stream(self, lines):
+        # Parse an iterable of lines (e.g. a file) one top-level statement
+        # at a time, and yield the transformed text of the statements as
+        # soon as they are complete; nothing else is kept in memory.
+        tokens = self.tokens.generate_tokens(iter(lines).__next__)
+        for chunk, _ in self._chunks(tokens):
+            yield str(chunk)
+
+    def document(self, source):
+        return Document(self, source)
+
+    def _chunks(self, tokens):
+        # Yield the transformed top-level statements in chunks (start
+        # symbol nodes), each along with the context of the statement
+        # following it; the last chunk (with the ENDMARKER) has none.
+        self.freeze()
+        dispatch, eager = self._dispatch_tables()
+        grammar = self.pgen2_driver.grammar
+        indexed, touched, fresh = [], [], []
+        convert = self._converter(
+            dispatch.keys(), eager, indexed, touched, fresh
+        )
+        driver = Driver(
+            grammar,
+            convert=convert,
+            collapse=True,
+            parser=self._parser_class(),
+        )
+        # This factory is bound while parsing and transforming, but not
+        # in the code that consumes the chunks.
+        steps = driver.parse_steps(tokens, step=1)
+        while True:
+            try:
+                with self.bound():
+                    parser = next(steps)
+            except StopIteration as stop:
+                tree = stop.value
+                break
+
+            # The children of the start symbol are complete statements,
+            # the ones before the statement that is being parsed.
+            completed = parser.stack[0][2][-1]
+            if not completed or len(parser.stack) == 1:
+                continue
+
+            chunk = pytree.Node(grammar.start, completed)
+            chunk.was_checked = self.fixpoint
+            completed.clear()
+            parser.used_names.clear()
+            context = parser.stack[1][2][2]
+            ready = [item for item in indexed if item[0] < context[1]]
+            indexed[:] = [item for item in indexed if item[0] >= context[1]]
+            for node in touched:
+                if _is_attached(node, chunk):
+                    _touch(node)
+            touched[:] = [
+                node for node in touched if not _is_attached(node, chunk)
+            ]
+            settled = [node for node in fresh if _is_attached(node, chunk)]
+            fresh[:] = [
+                node for node in fresh if not _is_attached(node, chunk)
+            ]
+            with self.bound():
+                self._apply(chunk, _pre_order(ready), dispatch, settled)
+            yield chunk, context
+
+        # The rest might be a lone leaf (the ENDMARKER)
+        if isinstance(tree, pytree.Leaf):
+            tree = pytree.Node(grammar.start, [tree])
+            tree.was_checked = self.fixpoint
+        for node in touched:
+            _touch(node)
+        with self.bound():
+            self._apply(tree, _pre_order(indexed), dispatch, fresh)
+        yield tree, None
+
+    def _apply(self, tree, nodes, dispatch, fresh=()):
+        fresh = [*fresh, *self._apply_round(tree, nodes, dispatch)]
+        if not self.fixpoint:
+            return
+        # Keep applying the transformers (the eager ones as well) to the
+        # nodes that are new, or whose subtree has changed since they
+        # were last seen (by another node's transformer, see _settle),
+        # until there are none left.
+        dispatch, eager = self._dispatch_tables(rounds=True)
+        dispatch.update(eager)
+        for _ in range(self.max_rounds):
+            nodes = list(_changed_nodes(tree, dispatch.keys()))
+            for node in fresh:
+                if _is_attached(node, tree):
+                    nodes.extend(_changed_nodes(node, dispatch.keys()))
+            if not nodes:
+                return
+            fresh = self._apply_round(tree, nodes, dispatch)
+        raise RuntimeError(
+            f"transformers haven't settled after {self.max_rounds} rounds"
+        )
+
+    def _apply_round(self, tree, nodes, dispatch):
+        if self.profile is not None:
+            number2symbol = self.rule_grammar.grammar.number2symbol
+            for node in nodes:
+                self.profile.visit(number2symbol[node.type])
+        # Returns the new nodes of the subtrees settled in fixpoint mode
+        fresh = []
+        for node in nodes:
+            # An earlier transformer might have detached this node
+            if not _is_attached(node, tree):
+                continue
+            if new := dispatch[node.type](node):
+                node.replace(new)
+            elif self.fixpoint:
+                _settle(node, fresh)
+        return fresh
+
+    def triggers(self):
+        # The keywords and operators the custom rules introduce on top of
+        # the stock grammar; a source without any of them can't contain
+        # a custom production.  None when no such set can be derived, e.g
+        # when there are transformers for stock rules, or for custom rules
+        # which can match without any of them (plain stock syntax).
+        if not self.custom_rules or not self.custom_rules.issuperset(
+            self.transformers
+        ):
+            return None
+
+        grammar = self.rule_grammar.grammar
+        stock = pygram.python_grammar
+        keywords = grammar.keywords.keys() - stock.keywords.keys()
+        token_types = grammar.tokens.keys() - stock.tokens.keys()
+        triggers = set(keywords)
+        for token_type in token_types:
+            token_name = self.tokens.tok_name[token_type]
+            if token_name not in self.tokens.opvalue:
+                return None
+            triggers.add(self.tokens.opvalue[token_name])
+
+        labels = {
+            label
+            for label, (type, value) in enumerate(grammar.labels)
+            if value in keywords or value is None and type in token_types
+        }
+        required = _requiring(grammar, labels)
+        for rule in self.transformers:
+            if grammar.symbol2number[rule] not in required:
+                return None
+        return frozenset(triggers) or None
+
+    def _may_trigger(self, source):
+        key = (self.rule_grammar.grammar, frozenset(self.transformers))
+        if self._trigger_cache is None or self._trigger_cache[0] != key:
+            self._trigger_cache = key, self._compile_triggers()
+        pattern = self._trigger_cache[1]
+        return pattern is None or pattern.search(source) is not None
+
+    def _compile_triggers(self):
+        triggers = self.triggers()
+        if triggers is None:
+            return None
+
+        alternatives = []
+        for trigger in sorted(triggers, key=len, reverse=True):
+            if trigger.isidentifier():
+                alternatives.append(rf"\b{trigger}\b")
+            else:
+                alternatives.append(re.escape(trigger))
+        return re.compile("|".join(alternatives))
+
+    def _dispatch_tables(self, rounds=False):
+        # The eager transformers count the nodes they visit themselves,
+        # except in the fixpoint rounds, where _apply_round does.
+        symbol2number = self.rule_grammar.grammar.symbol2number
+        dispatch, eager = {}, {}
+        for rule, transformer in self.transformers.items():
+            if self.profile is not None:
+                transformer = self.profile.profiled(
+                    rule,
+                    transformer,
+                    eager=rule in self.eager_rules and not rounds,
+                )
+            if rule in self.eager_rules:
+                eager[symbol2number[rule]] = transformer
+            else:
+                dispatch[symbol2number[rule]] = transformer
+        return dispatch, eager
+
+    def _parse(self, source, types, eager, step=None):
+        # Like the driver's parse_steps(), this pauses after every step
+        # tokens; returns the tree and the nodes of the given types.
+        indexed, touched, fresh = [], [], []
+        driver = Driver(
+            self.pgen2_driver.grammar,
+            convert=self._converter(types, eager, indexed, touched, fresh),
+            collapse=True,
+            parser=self._parser_class(),
+        )
+        tokens = self.tokens.generate_tokens(io.StringIO(source).readline)
+        tree = yield from driver.parse_steps(tokens, step=step)
+        for node in touched:
+            _touch(node)
+        return tree, _pre_order(indexed), fresh
+
+    def _parser_class(self):
+        # Generated for the grammar, and building the same trees as the
+        # parser the driver would pick otherwise
+        if self.compiled_parser:
+            return self.rule_grammar.compiled_parser()
+
+    def _converter(self, types, eager, indexed, touched, fresh):
+        # Collect the nodes of the given types while the tree is reduced,
+        # so the transformers can be applied without walking all of it.
+        # The eager transformers are applied right away; they run before
+        # the node has a parent, so the nodes they changed are collected
+        # in touched to propagate the change once it does (and in fixpoint
+        # mode, the new nodes in what they changed in fresh).  Like
+        # pytree.convert, it drops the symbols with a single child, which
+        # the drivers rely on to collapse unit chains.
+        counter = itertools.count()
+        checked = self.fixpoint
+        node_class = _ParsedNode if self.minimal_output else pytree.Node
+
+        def convert(grammar, raw_node):
+            # Same as pytree.convert, inlined since it runs for every
+            # token and every reduction.
+            type, value, context, children = raw_node
+            if children or type in grammar.number2symbol:
+                if len(children) == 1:
+                    return children[0]
+                node = node_class(type, children, context=context)
+                # Mark the parsed nodes as seen, for the later rounds
+                node.was_checked = checked
+                if type in eager:
+                    if new := eager[type](node):
+                        if new.parent is not None:
+                            new.remove()
+                        node = new
+                        touched.append(node)
+                    elif node.was_changed:
+                        if checked:
+                            _settle(node, fresh)
+                        touched.append(node)
+                elif type in types:
+                    # The start symbol is pushed without a context
+                    position = context[1] if context else (0, 0)
+                    indexed.append((position, -next(counter), node))
+                return node
+            else:
+                return pytree.Leaf(type, value, context=context)
+
+        return convert
+
     def register_token(self, token, token_name):
-        token_slot = self._next_free_token_slot()
-        _token.tok_name[token_slot] = token_name
-        setattr(_token, token_name, token_slot)
-        _grammar.opmap[token] = token_slot
-        _grammar.opvalue[token_name] = token
-        _tokenize.EXACT_TOKEN_TYPES[token] = token_slot
-        _tokenize.PseudoToken = _tokenize.Whitespace + _tokenize.group(
-            re.escape(token),
-            _tokenize.PseudoExtras,
-            _tokenize.Number,
-            _tokenize.Funny,
-            _tokenize.ContStr,
-            _tokenize.Name,
+        return self.tokens.register(token, token_name)
+
+    def transform_many(self, sources, workers=None, ordered=True):
+        # Transform many sources (strings) or files (path-like objects)
+        # on a pool of processes, which receive a copy of this factory
+        # once.  At most a couple of items per worker are in flight, so
+        # results are streamed back: in the order of the sources, or as
+        # (index, result) pairs as soon as they are ready, with largest
+        # items scheduled first.  In order, the sources are read as the
+        # workers free up; largest first needs all of them (but only the
+        # sizes of the files).
+        #
+        # The factory is pickled for the workers unless they are forked,
+        # and transformers defined inside functions (closures) can't be
+        # pickled, so with those this only works with the fork start
+        # method: not with spawn or forkserver, the defaults on macOS
+        # and Windows, and on Linux since Python 3.14.
+        items = enumerate(sources)
+        if not ordered:
+            items = sorted(items, key=_item_size, reverse=True)
+
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(self,)
         )
+        items = iter(items)
+        pending = {}  # future -> index, in the order of submission
+
+        def submit():
+            for index, item in itertools.islice(items, 1):
+                pending[pool.submit(_transform_item, item)] = index
+
+        try:
+            for _ in range(workers * 2):
+                submit()
+
+            if ordered:
+                while pending:
+                    future = next(iter(pending))
+                    result = future.result()
+                    del pending[future]
+                    submit()
+                    yield result
+            else:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        submit()
+                        yield index, future.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+
+_worker_factory = None
+
+
+def _init_worker(factory):
+    global _worker_factory
+    _worker_factory = factory
+
+
+def _item_size(indexed_item):
+    index, item = indexed_item
+    if isinstance(item, os.PathLike):
+        with suppress(OSError):
+            return os.path.getsize(item)
+        return 0
+    return len(item)
+
 
-    def _next_free_token_slot(self):
-        return max(_token.tok_name.keys() ^ {256}) + 1
+def _transform_item(item):
+    if isinstance(item, os.PathLike):
+        with open(item, encoding="utf-8") as stream:
+            item = stream.read()
+    return _worker_factory.transform(item)
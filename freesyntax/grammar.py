@@ -1,12 +1,18 @@
+import io
+import weakref
 from dataclasses import dataclass
 from typing import Tuple, Union
 
-from freesyntax.lib2to3.pgen2 import token
+from freesyntax.lib2to3.pgen2 import token, tokenize
 
 GrammarItem = Union[str, Tuple[str, ...]]
 
+# Representatives are hash-consed; equal ones made through Class[value]
+# are the same object, so their hashes and tokens are computed once.
+_interned = weakref.WeakValueDictionary()
 
-@dataclass(unsafe_hash=True)
+
+@dataclass(eq=True)
 class _GrammarRepresentative:
     value: GrammarItem
 
@@ -23,53 +29,159 @@ class _GrammarRepresentative:
     def __str__(self):
         return self._value
 
+    def __hash__(self):
+        # Cached, as the values nest deeply
+        if (result := self.__dict__.get("_hash")) is None:
+            result = self._hash = hash((self.value,))
+        return result
+
+    def __getstate__(self):
+        # String hashes differ between processes
+        state = self.__dict__.copy()
+        state.pop("_hash", None)
+        return state
+
     def __class_getitem__(cls, value):
-        return cls(value)
+        if cls.requires_sequence and not isinstance(value, tuple):
+            value = (value,)
+        try:
+            key = (cls, value)
+            if (representative := _interned.get(key)) is None:
+                representative = _interned[key] = cls(value)
+        except TypeError:
+            # Not hashable (e.g. a list), can't be shared
+            return cls(value)
+        return representative
+
+    @property
+    def tokens(self):
+        # The (type, value) pairs tokenizing str(self) would give, to
+        # feed the parser generator with.
+        if (result := self.__dict__.get("_tokens")) is None:
+            result = self._tokens = tuple(self.make_tokens())
+        return result
 
 
 class Token(_GrammarRepresentative):
     def initalize_representative(self):
-        if hasattr(token, self.value.upper()):
-            self._value = self.value.upper()
-        else:
-            raise ValueError(f"Unknown token, {self.value}!")
+        # Checked against the tokens of the factory the rule is given to
+        # (see RuleFactory.notify), which might have registered it
+        self._value = self.value.upper()
+
+    def make_tokens(self):
+        yield token.NAME, self._value
 
 
 class Rule(_GrammarRepresentative):
     def initalize_representative(self):
         self._value = self.value
 
+    def make_tokens(self):
+        yield token.NAME, self.value
+
 
 class Optional(_GrammarRepresentative, requires_sequence=True):
     def initalize_representative(self):
         self._value = f"[{' '.join(map(str, self.value))}]"
 
+    def make_tokens(self):
+        yield token.OP, "["
+        yield from item_tokens(self.value)
+        yield token.OP, "]"
+
 
 class Match(_GrammarRepresentative):
     def initalize_representative(self):
         self._value = f"{self.value!r}"
 
+    def make_tokens(self):
+        yield token.STRING, self._value
+
 
 class ZeroOrMore(_GrammarRepresentative):
     def initalize_representative(self):
         self._value = f"{self.value}*"
 
+    def make_tokens(self):
+        yield from item_tokens((self.value,))
+        yield token.OP, "*"
+
 
 class OneOrMore(_GrammarRepresentative):
     def initalize_representative(self):
         self._value = f"{self.value}+"
 
+    def make_tokens(self):
+        yield from item_tokens((self.value,))
+        yield token.OP, "+"
+
 
 class Unit(_GrammarRepresentative, requires_sequence=True):
     def initalize_representative(self):
         self._value = f"({' '.join(map(str, self.value))})"
 
+    def make_tokens(self):
+        yield token.OP, "("
+        yield from item_tokens(self.value)
+        yield token.OP, ")"
+
 
 class FreeUnit(_GrammarRepresentative, requires_sequence=True):
     def initalize_representative(self):
         self._value = " ".join(map(str, self.value))
 
+    def make_tokens(self):
+        yield from item_tokens(self.value)
+
 
 class Or(_GrammarRepresentative, requires_sequence=True):
     def initalize_representative(self):
         self._value = f"{' | '.join(map(str, self.value))}"
+
+    def make_tokens(self):
+        for index, item in enumerate(self.value):
+            if index:
+                yield token.OP, "|"
+            yield from item_tokens((item,))
+
+
+def item_tokens(items):
+    # The tokens of a sequence of grammar items; plain strings (e.g. the
+    # rules of the grammar file) still go through the tokenizer.
+    for item in items:
+        if isinstance(item, _GrammarRepresentative):
+            yield from item.tokens
+            continue
+        readline = io.StringIO(str(item)).readline
+        for current in tokenize.generate_tokens(readline):
+            if current[0] in {token.OP, token.NAME, token.STRING}:
+                yield current[:2]
+
+
+def token_names(items):
+    # The names of the tokens that grammar items refer to
+    for item in items:
+        if isinstance(item, Token):
+            yield str(item)
+        elif isinstance(item, _GrammarRepresentative):
+            value = item.value
+            if not isinstance(value, tuple):
+                value = (value,)
+            yield from token_names(value)
+
+
+def rule_tokens(rules):
+    # The {name: items} rules as the tokens of a grammar file, for the
+    # parser generator
+    def pairs():
+        for name, items in rules.items():
+            if isinstance(items, str):
+                items = (items,)
+            yield token.NAME, name
+            yield token.OP, ":"
+            yield from item_tokens(items)
+            yield token.NEWLINE, "\n"
+        yield token.ENDMARKER, ""
+
+    for token_type, value in pairs():
+        yield token_type, value, (0, 0), (0, 0), ""
@@ -0,0 +1,100 @@
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import marshal
+import os
+import struct
+import sys
+from contextlib import suppress
+
+from freesyntax.cache import write_atomic
+
+EXTENSION = ".fpy"
+
+# magic number, factory fingerprint, source mtime (ns) and size
+_HEADER = struct.Struct("<4s32sqq")
+
+
+class FreeSyntaxLoader(importlib.machinery.SourceFileLoader):
+    def __init__(self, fullname, path, factory):
+        super().__init__(fullname, path)
+        self.factory = factory
+
+    def get_code(self, fullname):
+        source_path = self.get_filename(fullname)
+        source_stat = os.stat(source_path)
+        header = _HEADER.pack(
+            importlib.util.MAGIC_NUMBER,
+            bytes.fromhex(self.factory.fingerprint()),
+            source_stat.st_mtime_ns,
+            source_stat.st_size,
+        )
+
+        bytecode_path = self.bytecode_path(source_path)
+        with suppress(OSError, ValueError, EOFError, TypeError):
+            with open(bytecode_path, "rb") as stream:
+                if stream.read(_HEADER.size) == header:
+                    return marshal.loads(stream.read())
+
+        source = importlib.util.decode_source(self.get_data(source_path))
+        code = compile(
+            self.factory.transform(source),
+            source_path,
+            "exec",
+            dont_inherit=True,
+        )
+        if not sys.dont_write_bytecode:
+            with suppress(OSError):
+                os.makedirs(os.path.dirname(bytecode_path), exist_ok=True)
+                write_atomic(bytecode_path, header + marshal.dumps(code))
+        return code
+
+    @staticmethod
+    def bytecode_path(source_path):
+        # Kept apart from the regular .pyc files, since a module.py
+        # next to module.fpy would otherwise share the cache file.
+        directory, filename = os.path.split(source_path)
+        stem = os.path.splitext(filename)[0]
+        tag = sys.implementation.cache_tag
+        return os.path.join(
+            directory, "__pycache__", f"{stem}.{tag}.freesyntax.pyc"
+        )
+
+
+class FreeSyntaxFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, factory, extension=EXTENSION):
+        self.factory = factory
+        self.extension = extension
+
+    def find_spec(self, fullname, path=None, target=None):
+        name = fullname.rpartition(".")[2]
+        for entry in sys.path if path is None else path:
+            directory = os.path.join(entry or os.curdir, name)
+            package = os.path.join(directory, "__init__" + self.extension)
+            if os.path.isfile(package):
+                return self._spec(fullname, package, [directory])
+
+            module = directory + self.extension
+            if os.path.isfile(module):
+                return self._spec(fullname, module)
+        return None
+
+    def _spec(self, fullname, path, search_locations=None):
+        loader = FreeSyntaxLoader(fullname, path, self.factory)
+        return importlib.util.spec_from_file_location(
+            fullname,
+            path,
+            loader=loader,
+            submodule_search_locations=search_locations,
+        )
+
+
+def install(factory, extension=EXTENSION):
+    finder = FreeSyntaxFinder(factory, extension)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(finder):
+    with suppress(ValueError):
+        sys.meta_path.remove(finder)
@@ -0,0 +1,209 @@
+"""Generate a parser module specialized to a grammar.
+
+Each DFA of the grammar becomes a function, with a branch per state
+and, in it, a branch per action: constant tests of the token's label
+(the first sets of the pushed symbols), followed by the pushes and
+the shift of the action, and every pop that is known to follow (the
+accept-only states of the symbols it pushed).  What is left to the
+tables are the pops into a frame the action didn't push, and those of
+the symbols of a chain (see parse.CollapsingParser), which are all
+done in one go.
+
+The generated Parser has the semantics of parse.CollapsingParser, so
+it needs a convert that drops the symbols with a single child (such
+as pytree.convert), and builds the same trees as that.  A module is
+made with load(generate(grammar)), and its Parser passed to the
+Driver.
+"""
+
+import types
+
+from .parse import CollapsingParser, ParseError
+
+# Of the generated code, for the keys of cached modules
+VERSION = 1
+
+HEADER = '''\
+# Generated by freesyntax.lib2to3.pgen2.codegen, do not edit.
+from freesyntax.lib2to3.pgen2.codegen import CompiledParser
+from freesyntax.lib2to3.pgen2.parse import ParseError, _Chain
+
+'''
+
+# The results of the symbol functions
+SHIFTED, DONE, POPPED = 0, 1, 2
+
+
+class CompiledParser(CollapsingParser):
+    """Base of the generated parsers."""
+
+    # Of the generated module: {symbol number: function}, the labels
+    # with an action and the accepting states of each symbol, and the
+    # accept-only (symbol, state) pairs
+    functions = {}
+    labels = {}
+    accepting = {}
+    accept_only = frozenset()
+
+    def addtoken(self, type, value, context):
+        """Add a token; return True iff this is the end of the program."""
+        ilabel = self.classify(type, value, context)
+        stack = self.stack
+        functions = self.functions
+        while True:
+            dfa, state, node = stack[-1]
+            if dfa is not None:
+                result = functions[node[0]](
+                    self, state, ilabel, type, value, context
+                )
+                if result != POPPED:
+                    return result == DONE
+                if not stack:
+                    # Done parsing, but another token is input
+                    raise ParseError("too much input", type, value, context)
+                continue
+            # Pop the symbols of a chain that have no action for the
+            # token, at once, and give the next one its frame
+            chain = state
+            pushes = chain.pushes
+            depth = chain.depth
+            if depth < len(pushes):
+                state = pushes[depth][1]
+            else:
+                state = chain.newstate
+            while True:
+                symbol = pushes[depth - 1][0]
+                if ilabel in self.labels[symbol][state]:
+                    chain.depth = depth
+                    self.materialize()
+                    break
+                if state not in self.accepting[symbol]:
+                    raise ParseError("bad input", type, value, context)
+                depth -= 1
+                if not depth:
+                    stack.pop()
+                    stack[-1][2][-1].append(chain.child)
+                    break
+                state = pushes[depth][1]
+
+    def settle(self):
+        """Pop while in an accept-only state.  (Internal)"""
+        stack = self.stack
+        while stack:
+            dfa, state, node = stack[-1]
+            if dfa is None:
+                symbol, state = state.top()
+            else:
+                symbol = node[0]
+            if (symbol, state) not in self.accept_only:
+                return SHIFTED
+            self.pop()
+        return DONE
+
+
+def generate(grammar):
+    """Return the source of a parser module for the grammar."""
+    actions = grammar.actions
+    accept_only = sorted(
+        (symbol, state)
+        for symbol in grammar.number2symbol
+        for state, (_, _, only) in enumerate(actions[symbol])
+        if only
+    )
+    lines = [HEADER]
+    for symbol in sorted(grammar.number2symbol):
+        lines.append(
+            f"\ndef _{symbol}(p, state, ilabel, type, value, context):\n"
+            f"    # {grammar.number2symbol[symbol]}\n"
+        )
+        for state, (table, accepting, _) in enumerate(actions[symbol]):
+            lines.append(f"    if state == {state}:\n")
+            groups = {}
+            for label, action in table.items():
+                groups.setdefault(action, []).append(label)
+            for (pushes, newstate), labels in groups.items():
+                if len(labels) == 1:
+                    test = f"ilabel == {labels[0]}"
+                else:
+                    test = f"ilabel in {{{', '.join(map(str, labels))}}}"
+                lines.append(f"        if {test}:\n")
+                for line in _action(grammar, symbol, pushes, newstate):
+                    lines.append(f"            {line}\n")
+            if accepting:
+                lines.append("        p.pop()\n")
+                lines.append(f"        return {POPPED}\n")
+            else:
+                lines.append(
+                    '        raise ParseError("bad input", type, value,'
+                    " context)\n"
+                )
+        lines.append("    raise AssertionError(state)\n")
+
+    symbols = sorted(grammar.number2symbol)
+    functions = ", ".join(f"{symbol}: _{symbol}" for symbol in symbols)
+    labels = {
+        symbol: tuple(frozenset(table) for table, _, _ in actions[symbol])
+        for symbol in symbols
+    }
+    accepting = {
+        symbol: frozenset(
+            state
+            for state, (_, accepts, _) in enumerate(actions[symbol])
+            if accepts
+        )
+        for symbol in symbols
+    }
+    lines.append(
+        f"\n\nclass Parser(CompiledParser):\n"
+        f"    functions = {{{functions}}}\n"
+        f"    labels = {labels!r}\n"
+        f"    accepting = {accepting!r}\n"
+        f"    accept_only = frozenset({accept_only!r})\n"
+    )
+    return "".join(lines)
+
+
+def _action(grammar, symbol, pushes, newstate):
+    # The statements of an action taken by a frame of symbol
+    def accept_only(symbol, state):
+        return grammar.actions[symbol][state][2]
+
+    yield "stack = p.stack"
+    yield "dfa, _, node = stack[-1]"
+    yield "leaf = p.convert(p.grammar, (type, value, context, None))"
+    if pushes:
+        # The pushed symbols that would be popped right away (in an
+        # accept-only state, with the token as their only descendant)
+        # are never pushed at all.
+        depth = len(pushes)
+        state = newstate
+        while depth and accept_only(pushes[depth - 1][0], state):
+            depth -= 1
+            state = pushes[depth][1]
+        if depth:
+            yield f"stack[-1] = (dfa, {pushes[0][1]}, node)"
+            yield f"chain = _Chain({pushes!r}, {newstate})"
+            if depth < len(pushes):
+                yield f"chain.depth = {depth}"
+            yield "chain.child = leaf"
+            yield (
+                f"stack.append((None, chain,"
+                f" ({pushes[0][0]}, None, context, None)))"
+            )
+            yield f"return {SHIFTED}"
+            return
+        newstate = pushes[0][1]
+    yield "node[-1].append(leaf)"
+    yield f"stack[-1] = (dfa, {newstate}, node)"
+    if accept_only(symbol, newstate):
+        yield "p.pop()"
+        yield "return p.settle()"
+    else:
+        yield f"return {SHIFTED}"
+
+
+def load(code, name="parser"):
+    """Return the module of generated source, or of its code object."""
+    module = types.ModuleType(name)
+    exec(code, module.__dict__)
+    return module
@@ -27,23 +27,50 @@ from . import grammar, parse, pgen, token, tokenize
 
 
 class Driver:
-    def __init__(self, grammar, convert=None, logger=None):
+    def __init__(
+        self, grammar, convert=None, logger=None, collapse=False, parser=None
+    ):
         self.grammar = grammar
         if logger is None:
             logger = logging.getLogger()
         self.logger = logger
         self.convert = convert
+        # Collapse unit chains while parsing, for converts that drop
+        # the symbols with a single child (see parse.CollapsingParser)
+        self.collapse = collapse
+        # A Parser class to use instead, e.g. one generated for the
+        # grammar (see codegen)
+        self.parser = parser
 
     def parse_tokens(self, tokens, debug=False):
         """Parse a series of tokens and return the syntax tree."""
+        return run_steps(self.parse_steps(tokens, debug))
+
+    def parse_steps(self, tokens, debug=False, step=None):
+        """Parse a series of tokens, pausing after every *step* tokens.
+
+        This is a generator, which yields the parser at each pause and
+        returns the syntax tree (see run_steps()).  Without a step it
+        never pauses.
+        """
         # XXX Move the prefix computation into a wrapper around tokenize.
-        p = parse.Parser(self.grammar, self.convert)
+        if step is not None:
+            tokens = _pausing(tokens, step)
+        if self.parser is not None:
+            p = self.parser(self.grammar, self.convert)
+        elif self.collapse:
+            p = parse.CollapsingParser(self.grammar, self.convert)
+        else:
+            p = parse.Parser(self.grammar, self.convert)
         p.setup()
         lineno = 1
         column = 0
         type = value = start = end = line_text = None
         prefix = ""
         for quintuple in tokens:
+            if quintuple is _PAUSE:
+                yield p
+                continue
             type, value, start, end, line_text = quintuple
             if start != (lineno, column):
                 assert (lineno, column) <= start, ((lineno, column), start)
@@ -63,7 +90,7 @@ class Driver:
                     column = 0
                 continue
             if type == token.OP:
-                type = grammar.opmap[value]
+                type = self.grammar.opmap[value]
             if debug:
                 self.logger.debug(
                     "%s %r (prefix=%r)", token.tok_name[type], value, prefix
@@ -104,6 +131,25 @@ class Driver:
         return self.parse_tokens(tokens, debug)
 
 
+_PAUSE = object()
+
+
+def _pausing(tokens, step):
+    for index, quintuple in enumerate(tokens, 1):
+        yield quintuple
+        if index % step == 0:
+            yield _PAUSE
+
+
+def run_steps(steps):
+    """Run a generator to its end and return its return value."""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
 def _generate_pickle_name(gt):
     head, tail = os.path.splitext(gt)
     if tail == ".txt":
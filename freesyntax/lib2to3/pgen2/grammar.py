@@ -71,6 +71,15 @@ class Grammar:
 
     tokens        -- a dict mapping token numbers to arc labels.
 
+    opmap         -- a dict mapping operator strings to token numbers
+                     (the module level opmap, unless the grammar uses
+                     tokens of its own); shared between copies.
+
+    actions       -- a dict mapping symbol numbers to the parser
+                     actions of their DFA states, derived from the
+                     tables above on the first use of each symbol (see
+                     make_actions()); not copied or dumped.
+
     """
 
     def __init__(self):
@@ -82,12 +91,53 @@ class Grammar:
         self.keywords = {}
         self.tokens = {}
         self.symbol2label = {}
+        self.opmap = opmap
         self.start = 256
 
+    @property
+    def actions(self):
+        if (actions := self.__dict__.get("_actions")) is None:
+            actions = self._actions = _Actions(self)
+        return actions
+
+    def make_actions(self, symbol):
+        """Resolve the parser actions of the states of a symbol.
+
+        Returns a list with an (actions, accepting, accept_only) triple
+        per state.  actions maps each label the state can take to a
+        (pushes, newstate) pair: the (symbol, return state) pairs to
+        push one after the other, then the state to shift the token to
+        (in the innermost DFA).  As in the arcs, the first arc that can
+        take a label wins.
+        """
+        states, first = self.dfas[symbol]
+        return [
+            self._state_actions(arcs, state)
+            for state, arcs in enumerate(states)
+        ]
+
+    def _state_actions(self, arcs, state):
+        table = {}
+        for label, newstate in arcs:
+            type = self.labels[label][0]
+            if label == 0:
+                continue
+            elif type < 256:
+                table.setdefault(label, ((), newstate))
+                continue
+            inner = self.actions.start(type)
+            for first_label in self.dfas[type][1]:
+                if first_label not in table:
+                    pushes, shift = inner[first_label]
+                    table[first_label] = (((type, newstate),) + pushes, shift)
+        return table, (0, state) in arcs, arcs == [(0, state)]
+
     def dump(self, filename):
         """Dump the grammar tables to a pickle file."""
+        state = self.__dict__.copy()
+        state.pop("_actions", None)
         with open(filename, "wb") as f:
-            pickle.dump(self.__dict__, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
 
     def load(self, filename):
         """Load the grammar tables from a pickle file."""
@@ -116,6 +166,7 @@ class Grammar:
         new.labels = self.labels[:]
         new.states = self.states[:]
         new.start = self.start
+        new.opmap = self.opmap
         return new
 
     def report(self):
@@ -135,6 +186,32 @@ class Grammar:
         print("start", self.start)
 
 
+class _Actions(dict):
+    # {symbol: Grammar.make_actions(symbol)}, made on the first lookup
+    # of a symbol.  The tables of the start states are kept on their
+    # own as well, as resolving a push needs the start state of the
+    # pushed symbol (which might be in the middle of its own resolution,
+    # when the rules are recursive).
+
+    def __init__(self, grammar):
+        super().__init__()
+        self.grammar = grammar
+        self.starts = {}
+
+    def __missing__(self, symbol):
+        value = self[symbol] = self.grammar.make_actions(symbol)
+        return value
+
+    def start(self, symbol):
+        if symbol in self:
+            return self[symbol][0][0]
+        if symbol not in self.starts:
+            states, first = self.grammar.dfas[symbol]
+            actions = self.grammar._state_actions(states[0], 0)
+            self.starts[symbol] = actions[0]
+        return self.starts[symbol]
+
+
 # Map from operator to number (since tokenize doesn't do this)
 
 opmap_raw = """
@@ -108,11 +108,13 @@ class Parser:
         """
         if start is None:
             start = self.grammar.start
-        # Each stack entry is a tuple: (dfa, state, node).
+        # Each stack entry is a tuple: (states, state, node), where states
+        # are the actions of the states of the node's symbol (see
+        # grammar.Grammar.actions).
         # A node is a tuple: (type, value, context, children),
         # where children is a list of nodes or None, and context may be None.
         newnode = (start, None, None, [])
-        stackentry = (self.grammar.dfas[start], 0, newnode)
+        stackentry = (self.grammar.actions[start], 0, newnode)
         self.stack = [stackentry]
         self.rootnode = None
         self.used_names = set()  # Aliased to self.rootnode.used_names in pop()
@@ -121,50 +123,39 @@ class Parser:
         """Add a token; return True iff this is the end of the program."""
         # Map from token to label
         ilabel = self.classify(type, value, context)
+        actions = self.grammar.actions
         # Loop until the token is shifted; may raise exceptions
         while True:
-            dfa, state, node = self.stack[-1]
-            states, first = dfa
-            arcs = states[state]
-            # Look for a state with this label
-            for i, newstate in arcs:
-                t, v = self.grammar.labels[i]
-                if ilabel == i:
-                    # Look it up in the list of labels
-                    assert t < 256
-                    # Shift a token; we're done with it
-                    self.shift(type, value, newstate, context)
-                    # Pop while we are in an accept-only state
-                    state = newstate
-                    while states[state] == [(0, state)]:
-                        self.pop()
-                        if not self.stack:
-                            # Done parsing!
-                            return True
-                        dfa, state, node = self.stack[-1]
-                        states, first = dfa
-                    # Done with this token
-                    return False
-                elif t >= 256:
-                    # See if it's a symbol and if we're in its first set
-                    itsdfa = self.grammar.dfas[t]
-                    itsstates, itsfirst = itsdfa
-                    if ilabel in itsfirst:
-                        # Push a symbol
-                        self.push(t, self.grammar.dfas[t], newstate, context)
-                        break  # To continue the outer while loop
-            else:
-                if (0, state) in arcs:
-                    # An accepting state, pop it and try something else
+            states, state, node = self.stack[-1]
+            table, accepting, accept_only = states[state]
+            # The resolved action: the symbols to push, if any, and the
+            # state to shift the token to
+            action = table.get(ilabel)
+            if action is not None:
+                pushes, newstate = action
+                for symbol, returnstate in pushes:
+                    self.push(symbol, actions[symbol], returnstate, context)
+                # Shift a token; we're done with it
+                self.shift(type, value, newstate, context)
+                # Pop while we are in an accept-only state
+                states, state, node = self.stack[-1]
+                while states[state][2]:
                     self.pop()
                     if not self.stack:
-                        # Done parsing, but another token is input
-                        raise ParseError(
-                            "too much input", type, value, context
-                        )
-                else:
-                    # No success finding a transition
-                    raise ParseError("bad input", type, value, context)
+                        # Done parsing!
+                        return True
+                    states, state, node = self.stack[-1]
+                # Done with this token
+                return False
+            elif accepting:
+                # An accepting state, pop it and try something else
+                self.pop()
+                if not self.stack:
+                    # Done parsing, but another token is input
+                    raise ParseError("too much input", type, value, context)
+            else:
+                # No success finding a transition
+                raise ParseError("bad input", type, value, context)
 
     def classify(self, type, value, context):
         """Turn a token into a label.  (Internal)"""
@@ -182,28 +173,155 @@ class Parser:
 
     def shift(self, type, value, newstate, context):
         """Shift a token.  (Internal)"""
-        dfa, state, node = self.stack[-1]
+        states, state, node = self.stack[-1]
         newnode = (type, value, context, None)
         newnode = self.convert(self.grammar, newnode)
         if newnode is not None:
             node[-1].append(newnode)
-        self.stack[-1] = (dfa, newstate, node)
+        self.stack[-1] = (states, newstate, node)
 
-    def push(self, type, newdfa, newstate, context):
+    def push(self, type, newstates, newstate, context):
         """Push a nonterminal.  (Internal)"""
-        dfa, state, node = self.stack[-1]
+        states, state, node = self.stack[-1]
         newnode = (type, None, context, [])
-        self.stack[-1] = (dfa, newstate, node)
-        self.stack.append((newdfa, 0, newnode))
+        self.stack[-1] = (states, newstate, node)
+        self.stack.append((newstates, 0, newnode))
 
     def pop(self):
         """Pop a nonterminal.  (Internal)"""
-        popdfa, popstate, popnode = self.stack.pop()
+        popstates, popstate, popnode = self.stack.pop()
         newnode = self.convert(self.grammar, popnode)
         if newnode is not None:
             if self.stack:
-                dfa, state, node = self.stack[-1]
+                states, state, node = self.stack[-1]
                 node[-1].append(newnode)
             else:
                 self.rootnode = newnode
                 self.rootnode.used_names = self.used_names
+
+
+class CollapsingParser(Parser):
+    """Parser engine that collapses unit chains.
+
+    The symbols pushed in one go to reach a token (e.g. test, or_test,
+    and_test, ..., atom for a name) are kept as a single chain entry
+    on the stack, rather than a frame and a raw node each.  A symbol
+    gets its frame only once it takes a second child; one reduced with
+    a single child never does, the child goes straight to the parent.
+
+    This gives the same tree only if convert returns the only child of
+    a symbol in place of the symbol (and never returns None), as
+    pytree.convert does.  A chain entry is a (None, chain, node) tuple,
+    where node is the raw node of its outermost symbol, without
+    children.
+    """
+
+    def addtoken(self, type, value, context):
+        """Add a token; return True iff this is the end of the program."""
+        ilabel = self.classify(type, value, context)
+        actions = self.grammar.actions
+        stack = self.stack
+        while True:
+            states, state, node = stack[-1]
+            if states is None:
+                symbol, state = state.top()
+                states = actions[symbol]
+                chained = True
+            else:
+                chained = False
+            table, accepting, accept_only = states[state]
+            action = table.get(ilabel)
+            if action is not None:
+                if chained:
+                    # A second child, the symbol needs its frame now
+                    self.materialize()
+                pushes, newstate = action
+                if pushes:
+                    self.push_chain(pushes, newstate, context)
+                    newnode = (type, value, context, None)
+                    stack[-1][1].child = self.convert(self.grammar, newnode)
+                else:
+                    self.shift(type, value, newstate, context)
+                # Pop while we are in an accept-only state
+                while True:
+                    states, state, node = stack[-1]
+                    if states is None:
+                        symbol, state = state.top()
+                        states = actions[symbol]
+                    if not states[state][2]:
+                        return False
+                    self.pop()
+                    if not stack:
+                        # Done parsing!
+                        return True
+            elif accepting:
+                # An accepting state, pop it and try something else
+                self.pop()
+                if not stack:
+                    # Done parsing, but another token is input
+                    raise ParseError("too much input", type, value, context)
+            else:
+                # No success finding a transition
+                raise ParseError("bad input", type, value, context)
+
+    def push_chain(self, pushes, newstate, context):
+        """Push the symbols of an action as a chain.  (Internal)"""
+        states, state, node = self.stack[-1]
+        self.stack[-1] = (states, pushes[0][1], node)
+        chain = _Chain(pushes, newstate)
+        self.stack.append((None, chain, (pushes[0][0], None, context, None)))
+
+    def materialize(self):
+        """Give the innermost symbol of the top chain a frame.  (Internal)"""
+        _, chain, outer = self.stack[-1]
+        symbol, state = chain.top()
+        newnode = (symbol, None, outer[2], [chain.child])
+        chain.depth -= 1
+        chain.child = None
+        if not chain.depth:
+            self.stack.pop()
+        self.stack.append((self.grammar.actions[symbol], state, newnode))
+
+    def pop(self):
+        """Pop a nonterminal.  (Internal)"""
+        states, state, node = self.stack[-1]
+        if states is None:
+            # A symbol with a single child, which is what it converts to
+            state.depth -= 1
+            if state.depth:
+                return
+            self.stack.pop()
+            newnode = state.child
+        else:
+            self.stack.pop()
+            newnode = self.convert(self.grammar, node)
+            if newnode is None:
+                return
+        if not self.stack:
+            self.rootnode = newnode
+            self.rootnode.used_names = self.used_names
+        elif self.stack[-1][0] is None:
+            self.stack[-1][1].child = newnode
+        else:
+            self.stack[-1][2][-1].append(newnode)
+
+
+class _Chain:
+    # The symbols of pushes[:depth] (outermost first) of an action, each
+    # in the state it returns to (the innermost one in the state the
+    # token was shifted to); the innermost one has child as its only
+    # child, the others have the next one.
+
+    __slots__ = ("pushes", "newstate", "depth", "child")
+
+    def __init__(self, pushes, newstate):
+        self.pushes = pushes
+        self.newstate = newstate
+        self.depth = len(pushes)
+        self.child = None
+
+    def top(self):
+        symbol = self.pushes[self.depth - 1][0]
+        if self.depth < len(self.pushes):
+            return symbol, self.pushes[self.depth][1]
+        return symbol, self.newstate
@@ -12,17 +12,58 @@ class PgenGrammar(grammar.Grammar):
 
 
 class ParserGenerator(object):
-    def __init__(self, source):
-        source = io.StringIO(source)
-        self.generator = tokenize.generate_tokens(source.readline)
-        self.gettoken()  # Initialize lookahead
-        self.dfas, self.startsymbol = self.parse()
-        source.close()
+    def __init__(self, source, opmap=None, tok_name=None):
+        # The token tables to resolve the labels with, the stock ones
+        # unless given
+        self.opmap = grammar.opmap if opmap is None else opmap
+        self.tok_name = token.tok_name if tok_name is None else tok_name
+        self.dfas, self.startsymbol = self.parse_source(source)
         self.first = {}  # map from symbol name to set of tokens
         self.addfirstsets()
 
+    def parse_source(self, source):
+        source = io.StringIO(source)
+        try:
+            return self.parse_tokens(tokenize.generate_tokens(source.readline))
+        finally:
+            source.close()
+
+    def parse_tokens(self, tokens):
+        # Tokens as from tokenize; only their types and values matter, so
+        # grammars built in memory can skip the text and the tokenizer.
+        self.generator = iter(tokens)
+        self.gettoken()  # Initialize lookahead
+        return self.parse()
+
+    def update_tokens(self, tokens):
+        # Replace the DFAs of the rules defined in tokens, and drop the
+        # first sets of them and of every rule that can begin with one
+        # of them; everything else is reused.  Returns the set of rules
+        # whose first sets were recomputed.
+        dfas, _ = self.parse_tokens(tokens)
+        self.dfas.update(dfas)
+        dependents = {}
+        for name, dfa in self.dfas.items():
+            for label in dfa[0].arcs:
+                if label in self.dfas:
+                    dependents.setdefault(label, set()).add(name)
+        stale = set(dfas)
+        todo = list(stale)
+        while todo:
+            for name in dependents.get(todo.pop(), ()):
+                if name not in stale:
+                    stale.add(name)
+                    todo.append(name)
+        for name in stale:
+            self.first.pop(name, None)
+        for name in sorted(stale):
+            if name not in self.first:
+                self.calcfirst(name)
+        return stale
+
     def make_grammar(self):
         c = PgenGrammar()
+        c.opmap = self.opmap
         names = list(self.dfas.keys())
         names.sort()
         names.remove(self.startsymbol)
@@ -32,20 +73,53 @@ class ParserGenerator(object):
             c.symbol2number[name] = i
             c.number2symbol[i] = name
         for name in names:
-            dfa = self.dfas[name]
-            states = []
-            for state in dfa:
-                arcs = []
-                for label, next in sorted(state.arcs.items()):
-                    arcs.append((self.make_label(c, label), dfa.index(next)))
-                if state.isfinal:
-                    arcs.append((0, dfa.index(state)))
-                states.append(arcs)
+            states = self.make_states(c, name)
             c.states.append(states)
             c.dfas[c.symbol2number[name]] = (states, self.make_first(c, name))
         c.start = c.symbol2number[self.startsymbol]
         return c
 
+    def update_grammar(self, grammar, changed, stale):
+        # Patch a grammar made by an earlier make_grammar() call after
+        # update(); only the states of the changed rules and the first
+        # sets of the stale ones are rebuilt.  New labels are appended,
+        # so the existing label numbers stay valid.
+        if not changed <= grammar.symbol2number.keys():
+            return self.make_grammar()
+        c = grammar.copy()
+        for name in sorted(stale):
+            number = c.symbol2number[name]
+            if name in changed:
+                states = self.make_states(c, name)
+                c.states[number - 256] = states
+            else:
+                states, first = c.dfas[number]
+            c.dfas[number] = (states, self.make_first(c, name))
+        # Forget the keywords and tokens that are no longer reachable,
+        # otherwise e.g. a dropped keyword would still shadow NAME.
+        used = set()
+        for states in c.states:
+            for arcs in states:
+                used.update(label for label, next in arcs)
+        for table in c.keywords, c.tokens:
+            for key, label in list(table.items()):
+                if label not in used:
+                    del table[key]
+        return c
+
+    def make_states(self, c, name):
+        dfa = self.dfas[name]
+        numbers = {id(state): i for i, state in enumerate(dfa)}
+        states = []
+        for i, state in enumerate(dfa):
+            arcs = []
+            for label, next in sorted(state.arcs.items()):
+                arcs.append((self.make_label(c, label), numbers[id(next)]))
+            if state.isfinal:
+                arcs.append((0, i))
+            states.append(arcs)
+        return states
+
     def make_first(self, c, name):
         rawfirst = self.first[name]
         first = {}
@@ -70,9 +144,12 @@ class ParserGenerator(object):
                     return ilabel
             else:
                 # A named token (NAME, NUMBER, STRING)
-                itoken = getattr(token, label, None)
-                assert isinstance(itoken, int), label
-                assert itoken in token.tok_name, label
+                itoken = None
+                for number, name in self.tok_name.items():
+                    if name == label:
+                        itoken = number
+                if itoken is None:
+                    raise ValueError(f"Unknown token, {label}!")
                 if itoken in c.tokens:
                     return c.tokens[itoken]
                 else:
@@ -93,7 +170,7 @@ class ParserGenerator(object):
                     return ilabel
             else:
                 # An operator (any non-numeric token)
-                itoken = grammar.opmap[value]  # Fails if unknown token
+                itoken = self.opmap[value]  # Fails if unknown token
                 if itoken in c.tokens:
                     return c.tokens[itoken]
                 else:
@@ -168,38 +245,59 @@ class ParserGenerator(object):
     def make_dfa(self, start, finish):
         # To turn an NFA into a DFA, we define the states of the DFA
         # to correspond to *sets* of states of the NFA.  Then do some
-        # state reduction.  Let's represent sets as dicts with 1 for
-        # values.
+        # state reduction.  The NFA states are numbered, and the sets
+        # are frozensets of those numbers, so the DFA state of a set is
+        # found with a lookup.
         assert isinstance(start, NFAState)
         assert isinstance(finish, NFAState)
 
-        def closure(state):
-            base = {}
-            addclosure(state, base)
-            return base
-
-        def addclosure(state, base):
-            assert isinstance(state, NFAState)
-            if state in base:
-                return
-            base[state] = 1
+        numbers = {start: 0}
+        nfa = [start]
+        for state in nfa:  # NB nfa grows while we're iterating
             for label, next in state.arcs:
-                if label is None:
-                    addclosure(next, base)
-
-        states = [DFAState(closure(start), finish)]
+                if next not in numbers:
+                    numbers[next] = len(nfa)
+                    nfa.append(next)
+        arcs = [
+            [(label, numbers[next]) for label, next in state.arcs]
+            for state in nfa
+        ]
+
+        closures = [None] * len(nfa)
+
+        def closure(number):
+            if closures[number] is None:
+                base = {number}
+                todo = [number]
+                while todo:
+                    for label, next in arcs[todo.pop()]:
+                        if label is None and next not in base:
+                            base.add(next)
+                            todo.append(next)
+                closures[number] = frozenset(base)
+            return closures[number]
+
+        # The labelled arcs of each NFA state, to the closures they reach
+        moves = [
+            [(label, closure(next)) for label, next in out if label]
+            for out in arcs
+        ]
+
+        final = numbers.get(finish)
+        states = [DFAState(closure(0), final)]
+        by_nfaset = {states[0].nfaset: states[0]}
         for state in states:  # NB states grows while we're iterating
-            arcs = {}
-            for nfastate in state.nfaset:
-                for label, next in nfastate.arcs:
-                    if label is not None:
-                        addclosure(next, arcs.setdefault(label, {}))
-            for label, nfaset in sorted(arcs.items()):
-                for st in states:
-                    if st.nfaset == nfaset:
-                        break
-                else:
-                    st = DFAState(nfaset, finish)
+            targets = {}
+            for number in state.nfaset:
+                for label, nfaset in moves[number]:
+                    if label in targets:
+                        targets[label] |= nfaset
+                    else:
+                        targets[label] = set(nfaset)
+            for label, nfaset in sorted(targets.items()):
+                nfaset = frozenset(nfaset)
+                if (st := by_nfaset.get(nfaset)) is None:
+                    st = by_nfaset[nfaset] = DFAState(nfaset, final)
                     states.append(st)
                 state.addarc(st, label)
         return states  # List of DFAState instances; first one is start
@@ -228,25 +326,64 @@ class ParserGenerator(object):
                 print("    %s -> %d" % (label, dfa.index(next)))
 
     def simplify_dfa(self, dfa):
-        # This is not theoretically optimal, but works well enough.
-        # Algorithm: repeatedly look for two states that have the same
-        # set of arcs (same labels pointing to the same nodes) and
-        # unify them, until things stop changing.
+        # Minimize the DFA with Hopcroft's partition refinement: start
+        # from the final and the other states, and split the blocks by
+        # the states they reach over each label, until no split is left.
+        # (A missing arc splits a block as well, so every block starts
+        # out as a splitter.)  Each block keeps its first state, in the
+        # original order.
 
         # dfa is a list of DFAState instances
-        changes = True
-        while changes:
-            changes = False
-            for i, state_i in enumerate(dfa):
-                for j in range(i + 1, len(dfa)):
-                    state_j = dfa[j]
-                    if state_i == state_j:
-                        # print "  unify", i, j
-                        del dfa[j]
-                        for state in dfa:
-                            state.unifystate(state_j, state_i)
-                        changes = True
-                        break
+        if len(dfa) < 2:
+            return
+        numbers = {id(state): i for i, state in enumerate(dfa)}
+        incoming = [[] for state in dfa]
+        for i, state in enumerate(dfa):
+            for label, next in state.arcs.items():
+                incoming[numbers[id(next)]].append((label, i))
+
+        blocks = [
+            {i for i, state in enumerate(dfa) if state.isfinal},
+            {i for i, state in enumerate(dfa) if not state.isfinal},
+        ]
+        blocks = [block for block in blocks if block]
+        block_of = [0] * len(dfa)
+        for index, block in enumerate(blocks):
+            for i in block:
+                block_of[i] = index
+        pending = set(range(len(blocks)))
+        while pending:
+            sources = {}
+            for target in blocks[pending.pop()]:
+                for label, i in incoming[target]:
+                    sources.setdefault(label, set()).add(i)
+            for inside in sources.values():
+                touched = {}
+                for i in inside:
+                    touched.setdefault(block_of[i], set()).add(i)
+                for index, part in touched.items():
+                    block = blocks[index]
+                    if len(part) == len(block):
+                        continue
+                    block -= part
+                    blocks.append(part)
+                    new = len(blocks) - 1
+                    for i in part:
+                        block_of[i] = new
+                    if index in pending or len(part) <= len(block):
+                        pending.add(new)
+                    else:
+                        pending.add(index)
+
+        if len(blocks) == len(dfa):
+            return
+        first = [min(block) for block in blocks]
+        for state in dfa:
+            for label, next in state.arcs.items():
+                state.arcs[label] = dfa[first[block_of[numbers[id(next)]]]]
+        dfa[:] = [
+            state for i, state in enumerate(dfa) if first[block_of[i]] == i
+        ]
 
     def parse_rhs(self):
         # RHS: ALT ('|' ALT)*
@@ -356,9 +493,9 @@ class NFAState(object):
 
 class DFAState(object):
     def __init__(self, nfaset, final):
-        assert isinstance(nfaset, dict)
-        assert isinstance(next(iter(nfaset)), NFAState)
-        assert isinstance(final, NFAState)
+        # nfaset holds the numbers of the NFA states, final the number
+        # of the final one
+        assert isinstance(nfaset, frozenset)
         self.nfaset = nfaset
         self.isfinal = final in nfaset
         self.arcs = {}  # map from label to DFAState
@@ -0,0 +1,479 @@
+"""A compact binary format of the grammar tables.
+
+The tables are flat arrays of native integers (and bitsets for the
+first sets), so a file can be memory-mapped and used in place: the
+pages are shared between processes (e.g. forked workers), and loading
+one only decodes the small tables (labels, keywords, symbol names).
+The parser's action tables (see Grammar.actions) are stored resolved,
+with a row per state indexed by label, and the parsers look them up in
+the mapped arrays; what a process keeps on its heap is a small object
+per state of the symbols it parsed, and the actions it took (decoded
+once).  The DFAs are only built, on the heap, for other uses of the
+grammar (the first time a symbol is looked up).
+
+Layout, after the header (magic, version, byte order, counts), all
+int32 unless noted:
+
+    symbol_states -- per symbol, the index of its first state (and
+                     one past the last one at the end)
+    state_arcs    -- per state, the index of its first arc (likewise)
+    arcs          -- (label, next state) pairs
+    labels        -- (token or symbol number, keyword string or -1)
+    keywords      -- (keyword string, label) pairs
+    tokens        -- (token number, label) pairs
+    opmap         -- (operator string, token number) pairs
+    symbol_names  -- per symbol, its name string
+    action_rows   -- per state, per label, the index of its action
+                     or -1
+    actions       -- (index of the first push, one past the last one,
+                     new state) triples
+    pushes        -- (symbol, return state) pairs
+    first         -- per symbol, a bitset over the labels (bytes)
+    state_flags   -- per state, ACCEPTING and ACCEPT_ONLY (bytes)
+    strings       -- the strings, NUL separated and encoded as UTF-8
+                     (bytes)
+
+Symbols are numbered from 256 up, without gaps, as pgen does.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Set
+
+from . import grammar
+
+MAGIC = b"FSGT"
+VERSION = 2
+
+# The state flags
+ACCEPTING, ACCEPT_ONLY = 1, 2
+
+_HEADER = struct.Struct("=4sIB3x12i")
+_BYTE_ORDER = {"little": 1, "big": 2}[sys.byteorder]
+_ITEM = array("i").itemsize
+
+
+def dumps(tables):
+    """Return the tables of a grammar in the binary format."""
+    strings = {}
+
+    def string(value):
+        return strings.setdefault(value, len(strings))
+
+    numbers = sorted(tables.number2symbol)
+    if numbers != list(range(256, 256 + len(numbers))):
+        raise ValueError("symbols must be numbered from 256 without gaps")
+
+    symbol_states = array("i", [0])
+    state_arcs = array("i", [0])
+    arcs = array("i")
+    for number in numbers:
+        states, first = tables.dfas[number]
+        for state in states:
+            for label, next in state:
+                arcs.extend((label, next))
+            state_arcs.append(len(arcs) // 2)
+        symbol_states.append(len(state_arcs) - 1)
+
+    labels = array("i")
+    for type, value in tables.labels:
+        labels.extend((type, -1 if value is None else string(value)))
+    keywords = array("i")
+    for keyword, label in tables.keywords.items():
+        keywords.extend((string(keyword), label))
+    tokens = array("i")
+    for type, label in tables.tokens.items():
+        tokens.extend((type, label))
+    opmap = array("i")
+    for operator, type in tables.opmap.items():
+        opmap.extend((string(operator), type))
+    symbol_names = array(
+        "i", [string(tables.number2symbol[number]) for number in numbers]
+    )
+
+    # The actions are shared between the states (and their pushes
+    # between the actions) that have the same ones.
+    action_rows = array("i")
+    actions = array("i")
+    pushes = array("i")
+    action_index = {}
+    push_index = {}
+    state_flags = bytearray()
+    for number in numbers:
+        for table, accepting, accept_only in tables.actions[number]:
+            row = [-1] * len(tables.labels)
+            for label, action in table.items():
+                if action not in action_index:
+                    symbol_pushes, newstate = action
+                    if symbol_pushes not in push_index:
+                        push_index[symbol_pushes] = len(pushes) // 2
+                        for pair in symbol_pushes:
+                            pushes.extend(pair)
+                    start = push_index[symbol_pushes]
+                    action_index[action] = len(actions) // 3
+                    actions.extend(
+                        (start, start + len(symbol_pushes), newstate)
+                    )
+                row[label] = action_index[action]
+            action_rows.extend(row)
+            state_flags.append(
+                (accepting and ACCEPTING) | (accept_only and ACCEPT_ONLY)
+            )
+
+    width = (len(tables.labels) + 7) // 8
+    first = bytearray(width * len(numbers))
+    for index, number in enumerate(numbers):
+        for label in tables.dfas[number][1]:
+            first[index * width + label // 8] |= 1 << label % 8
+
+    blob = "\0".join(strings).encode("utf-8")
+
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        _BYTE_ORDER,
+        tables.start,
+        len(numbers),
+        len(state_arcs) - 1,
+        len(arcs) // 2,
+        len(tables.labels),
+        len(tables.keywords),
+        len(tables.tokens),
+        len(tables.opmap),
+        len(strings),
+        len(blob),
+        len(actions) // 3,
+        len(pushes) // 2,
+    )
+    sections = [
+        symbol_states,
+        state_arcs,
+        arcs,
+        labels,
+        keywords,
+        tokens,
+        opmap,
+        symbol_names,
+        action_rows,
+        actions,
+        pushes,
+    ]
+    return b"".join(
+        [
+            header,
+            *(section.tobytes() for section in sections),
+            first,
+            state_flags,
+            blob,
+        ]
+    )
+
+
+def dump(tables, filename):
+    """Write the tables of a grammar to a file in the binary format."""
+    with open(filename, "wb") as stream:
+        stream.write(dumps(tables))
+
+
+def loads(data):
+    """Return a GrammarView of the tables in data (e.g. bytes)."""
+    return GrammarView(data)
+
+
+def load(filename):
+    """Return a GrammarView of the tables in a file, memory-mapped."""
+    with open(filename, "rb") as stream:
+        buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    view = GrammarView(buffer)
+    view.filename = filename
+    return view
+
+
+class GrammarView(grammar.Grammar):
+    """Grammar tables read from a buffer in the binary format.
+
+    It can be used anywhere a Grammar is, and is meant to be read
+    only; copy() returns a regular Grammar to modify.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.filename = None
+        memory = memoryview(buffer)
+        if len(memory) < _HEADER.size:
+            raise ValueError("truncated grammar tables")
+        (
+            magic,
+            version,
+            byte_order,
+            self.start,
+            symbols,
+            states,
+            arcs,
+            labels,
+            keywords,
+            tokens,
+            operators,
+            strings,
+            blob_size,
+            actions,
+            pushes,
+        ) = _HEADER.unpack_from(memory)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not grammar tables of this version")
+        if byte_order != _BYTE_ORDER:
+            raise ValueError("grammar tables of another byte order")
+
+        position = _HEADER.size
+
+        def section(count, format="i"):
+            nonlocal position
+            size = count * (_ITEM if format == "i" else 1)
+            if position + size > len(memory):
+                raise ValueError("truncated grammar tables")
+            part = memory[position : position + size].cast(format)
+            position += size
+            return part
+
+        self.symbol_states = section(symbols + 1)
+        self.state_arcs = section(states + 1)
+        self.arcs = section(2 * arcs)
+        label_pairs = section(2 * labels)
+        keyword_pairs = section(2 * keywords)
+        token_pairs = section(2 * tokens)
+        operator_pairs = section(2 * operators)
+        symbol_names = section(symbols)
+        self.action_rows = section(states * labels)
+        self.action_triples = section(3 * actions)
+        self.push_pairs = section(2 * pushes)
+        self.width = (labels + 7) // 8
+        self.first = section(symbols * self.width, "B")
+        self.state_flags = section(states, "B")
+        values = str(section(blob_size, "B"), "utf-8").split("\0")
+        if len(values) != max(strings, 1):
+            raise ValueError("corrupt grammar tables")
+        self.symbol2number = {
+            values[name]: 256 + index
+            for index, name in enumerate(symbol_names)
+        }
+        self.number2symbol = {
+            number: name for name, number in self.symbol2number.items()
+        }
+        pairs = label_pairs.tolist()
+        self.labels = [
+            (type, None if value < 0 else values[value])
+            for type, value in zip(pairs[::2], pairs[1::2])
+        ]
+        self.keywords = {
+            values[keyword_pairs[i]]: keyword_pairs[i + 1]
+            for i in range(0, 2 * keywords, 2)
+        }
+        self.tokens = {
+            token_pairs[i]: token_pairs[i + 1]
+            for i in range(0, 2 * tokens, 2)
+        }
+        self.opmap = {
+            values[operator_pairs[i]]: operator_pairs[i + 1]
+            for i in range(0, 2 * operators, 2)
+        }
+        self.dfas = _DFAs(self)
+        self.decoded_actions = {}
+        self._mapped_actions = _MappedActions(self)
+
+    @property
+    def actions(self):
+        return self._mapped_actions
+
+    def decode_action(self, index):
+        start, end, newstate = self.action_triples[3 * index : 3 * index + 3]
+        pairs = iter(self.push_pairs[2 * start : 2 * end].tolist())
+        return tuple(zip(pairs, pairs)), newstate
+
+    @property
+    def symbol2label(self):
+        return {
+            self.number2symbol[type]: label
+            for label, (type, value) in enumerate(self.labels)
+            if type >= 256
+        }
+
+    @property
+    def states(self):
+        return [self.dfas[number][0] for number in sorted(self.number2symbol)]
+
+    def symbol_dfa(self, number):
+        index = number - 256
+        states = []
+        first_state = self.symbol_states[index]
+        for state in range(first_state, self.symbol_states[index + 1]):
+            start, end = self.state_arcs[state], self.state_arcs[state + 1]
+            pairs = self.arcs[2 * start : 2 * end].tolist()
+            states.append(list(zip(pairs[::2], pairs[1::2])))
+        first = FirstSet(
+            self.first[index * self.width : (index + 1) * self.width]
+        )
+        return states, first
+
+    def copy(self):
+        new = grammar.Grammar()
+        new.symbol2number = self.symbol2number.copy()
+        new.number2symbol = self.number2symbol.copy()
+        new.dfas = {
+            number: (states, dict.fromkeys(first, 1))
+            for number, (states, first) in self.dfas.items()
+        }
+        new.states = [new.dfas[number][0] for number in sorted(new.dfas)]
+        new.labels = self.labels[:]
+        new.keywords = self.keywords.copy()
+        new.tokens = self.tokens.copy()
+        new.symbol2label = self.symbol2label
+        new.start = self.start
+        new.opmap = self.opmap
+        return new
+
+    def __reduce__(self):
+        # A mapped file is mapped again (sharing its pages), anything
+        # else is copied; the opmap might have been replaced since.
+        if self.filename is not None:
+            return load, (self.filename,), {"opmap": self.opmap}
+        return loads, (bytes(self.buffer),), {"opmap": self.opmap}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class _DFAs(dict):
+    # {symbol number: (states, first)}; the entry of a symbol is made
+    # from the buffer on its first lookup.
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+
+    def __missing__(self, number):
+        if number not in self.view.number2symbol:
+            raise KeyError(number)
+        value = self[number] = self.view.symbol_dfa(number)
+        return value
+
+    def __contains__(self, number):
+        return number in self.view.number2symbol
+
+    def __iter__(self):
+        return iter(self.view.number2symbol)
+
+    def __len__(self):
+        return len(self.view.number2symbol)
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def get(self, number, default=None):
+        return self[number] if number in self else default
+
+    def keys(self):
+        return self.view.number2symbol.keys()
+
+    def values(self):
+        return [self[number] for number in self]
+
+    def items(self):
+        return [(number, self[number]) for number in self]
+
+    def copy(self):
+        return dict(self.items())
+
+
+class _MappedActions(dict):
+    # {symbol number: the (actions, accepting, accept_only) triples of
+    # its states}, as Grammar.actions; the entry of a symbol is made on
+    # its first lookup, and its actions are read from the buffer.
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+
+    def __missing__(self, number):
+        if number not in self.view.number2symbol:
+            raise KeyError(number)
+        view = self.view
+        index = number - 256
+        value = self[number] = [
+            (
+                _StateActions(view, state),
+                bool(view.state_flags[state] & ACCEPTING),
+                bool(view.state_flags[state] & ACCEPT_ONLY),
+            )
+            for state in range(
+                view.symbol_states[index], view.symbol_states[index + 1]
+            )
+        ]
+        return value
+
+    def __contains__(self, number):
+        return number in self.view.number2symbol
+
+    def __iter__(self):
+        return iter(self.view.number2symbol)
+
+    def __len__(self):
+        return len(self.view.number2symbol)
+
+
+class _StateActions(Mapping):
+    # {label: (pushes, newstate)} of a state, read from its row of the
+    # buffer on every lookup.  The actions are decoded once per view,
+    # and only those that are taken.
+
+    def __init__(self, view, state):
+        self.view = view
+        self.rows = view.action_rows
+        self.decoded = view.decoded_actions
+        self.labels = len(view.labels)
+        self.offset = state * self.labels
+
+    def get(self, label, default=None):
+        if not 0 <= label < self.labels:
+            return default
+        index = self.rows[self.offset + label]
+        if index < 0:
+            return default
+        if (action := self.decoded.get(index)) is None:
+            action = self.decoded[index] = self.view.decode_action(index)
+        return action
+
+    def __getitem__(self, label):
+        if (action := self.get(label)) is None:
+            raise KeyError(label)
+        return action
+
+    def __iter__(self):
+        row = self.rows[self.offset : self.offset + self.labels]
+        return (label for label, index in enumerate(row) if index >= 0)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class FirstSet(Set):
+    """The labels of a first set, as a read-only bitset."""
+
+    def __init__(self, bits):
+        self.bits = bits
+
+    def __contains__(self, label):
+        byte = label >> 3
+        return 0 <= byte < len(self.bits) and bool(
+            self.bits[byte] >> (label & 7) & 1
+        )
+
+    def __iter__(self):
+        for byte, bits in enumerate(self.bits):
+            for bit in range(8):
+                if bits >> bit & 1:
+                    yield byte * 8 + bit
+
+    def __len__(self):
+        return sum(bin(bits).count("1") for bits in self.bits)
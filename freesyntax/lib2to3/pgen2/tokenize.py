@@ -542,7 +542,9 @@ def tokenize(readline, tokeneater=None):
     return _tokenize(rl_gen.__next__, encoding)
 
 
-def _tokenize(readline, encoding):
+def _tokenize(readline, encoding, pseudoprog=None):
+    if pseudoprog is None:
+        pseudoprog = _compile(PseudoToken)
     lnum = parenlev = continued = 0
     numchars = "0123456789"
     contstr, needcont = "", 0
@@ -670,7 +672,7 @@ def _tokenize(readline, encoding):
             continued = 0
 
         while pos < max:
-            pseudomatch = _compile(PseudoToken).match(line, pos)
+            pseudomatch = pseudoprog.match(line, pos)
             if pseudomatch:  # scan for tokens
                 start, end = pseudomatch.span(1)
                 spos, epos, pos = (lnum, start), (lnum, end), end
@@ -826,8 +828,8 @@ def _tokenize(readline, encoding):
 
 # An undocumented, backwards compatible, API for all the places in the standard
 # library that expect to be able to use tokenize with strings
-def generate_tokens(readline):
-    return _tokenize(readline, None)
+def generate_tokens(readline, pseudoprog=None):
+    return _tokenize(readline, None, pseudoprog)
 
 
 # An undocumented, backwards compatible, API for users looping over tokens
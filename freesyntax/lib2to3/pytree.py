@@ -346,7 +346,7 @@ class Leaf(Base):
         if context is not None:
             self._prefix, (self.lineno, self.column) = context
         self.type = type
-        self.value = value
+        self._value = value
         if prefix is not None:
             self._prefix = prefix
         self.fixers_applied = fixers_applied[:]
@@ -401,6 +401,18 @@ class Leaf(Base):
         self.changed()
         self._prefix = prefix
 
+    @property
+    def value(self):
+        """
+        The string value of this token.
+        """
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self.changed()
+        self._value = value
+
 
 def convert(gr, raw_node):
     """
@@ -1,126 +1,165 @@
+import functools
+import re
 import token
-from contextlib import contextmanager, suppress
+import tokenize
+from collections.abc import Mapping
 
 from freesyntax import grammar
-from freesyntax.shortcuts import get_tokens, untokenize
+from freesyntax.shortcuts import get_tokens
 
-IGNORED = frozenset((token.NEWLINE, token.COMMENT, token.NL))
-DEBUG = True
-
-
-class Finish(Exception):
-    pass
-
-
-class ExpectationReached(Exception):
-    pass
+IGNORED = frozenset(
+    (token.NEWLINE, token.COMMENT, token.NL, token.INDENT, token.DEDENT)
+)
+GROUPS = {token.LPAR: token.RPAR, token.LBRACE: token.RBRACE}
+ITEM_START = frozenset((token.LSQB, token.NAME, token.STRING, *GROUPS))
+# A rule starts with its name and a colon, at the start of a line
+RULE_START = re.compile(r"^(\w+)[ \t]*:", re.MULTILINE)
 
 
 class RuleParser:
+    # Recursive descent over the notation of Grammar.txt (as in pgen),
+    # with a cursor into the tokens:
+    #   rhs: alt ('|' alt)*
+    #   alt: item+
+    #   item: '[' rhs ']' | atom ['+' | '*']
+    #   atom: '(' rhs ')' | NAME | STRING
+    # Braces are accepted as parentheses.
+
     def __init__(self, source):
-        self.tokens = list(get_tokens(source))
-        self.state = self.tokens.pop(0)
-        self.result = []
-        self.contexts = []
-
-    def eat(self):
-        if len(self.tokens) == 0:
-            raise Finish
-        if (
-            len(self.contexts) > 0
-            and self.state.exact_type == self.contexts[-1]
-        ):
-            raise ExpectationReached
-        self.state = self.tokens.pop(0)
-        if self.state.exact_type == token.ENDMARKER:
-            raise Finish
-        if (
-            len(self.contexts) > 0
-            and self.state.exact_type == self.contexts[-1]
-        ):
-            raise Finish
-        return self.state
-
-    @contextmanager
-    def sub_context(self, expected):
-        buffer = []
-        _result = self.result
-        self.result = buffer
-        self.contexts.append(expected)
         try:
-            yield buffer
-        except ExpectationReached:
-            pass
-        finally:
-            self.contexts.pop()
-            self.result = _result.copy()
-
-    def parse_until(self, expected):
-        with self.sub_context(expected) as buffer:
-            while self.eat().exact_type != expected:
-                buffer.append(self.parse_single())
-
-        return buffer
-
-    def parse_single(self):
-        rule = []
-
-        def unwrap(items):
-            for item in items:
-                if isinstance(item, tuple):
-                    yield from item
-                else:
-                    yield item
-
-        if self.state.exact_type == token.LBRACE:
-            return grammar.Unit[tuple(unwrap(self.parse_until(token.RBRACE)))]
-        elif self.state.exact_type == token.LSQB:
-            return grammar.Optional[
-                tuple(unwrap(self.parse_until(token.RSQB)))
-            ]
-        elif self.state.exact_type == token.LPAR:
-            return grammar.Unit[tuple(unwrap(self.parse_until(token.RPAR)))]
-        elif self.state.exact_type == token.NAME:
-            if self.state.string.isupper():
-                return grammar.Token[self.state.string]
-            elif self.state.string.islower():
-                return grammar.Rule[self.state.string]
-            else:
-                raise ValueError(
-                    f"Unknown grammar item, '{self.state.string}'."
-                )
-        elif self.state.exact_type == token.STRING:
-            return grammar.Match[self.state.string[1:-1]]
-        elif self.state.exact_type == token.STAR and len(self.result) > 0:
-            return grammar.ZeroOrMore[self.result.pop()]
-        elif self.state.exact_type == token.PLUS and len(self.result) > 0:
-            return grammar.OneOrMore[self.result.pop()]
-        elif self.state.exact_type == token.VBAR and len(self.result) > 0:
-            left = grammar.FreeUnit(tuple(self.result))
-            self.result.clear()
+            tokens = get_tokens(source)
+        except tokenize.TokenError as error:
+            raise ValueError(f"Invalid rule, {error.args[0]}.") from None
+        self.tokens = [
+            current for current in tokens if current.exact_type not in IGNORED
+        ]
+        self.position = 0
+
+    @property
+    def state(self):
+        return self.tokens[self.position]
+
+    def eat(self, expected=None):
+        current = self.state
+        if expected is not None and current.exact_type != expected:
+            self.error(f"Expected {token.tok_name[expected]}")
+        if current.exact_type != token.ENDMARKER:
+            self.position += 1
+        return current
+
+    def error(self, message):
+        line, column = self.state.start
+        raise ValueError(
+            f"{message}, got '{self.state.string}' at {line}:{column}."
+        )
+
+    def parse(self):
+        items = self.parse_rhs()
+        if self.state.exact_type != token.ENDMARKER:
+            self.error("Unexpected grammar item")
+        return items
+
+    def parse_rhs(self):
+        alternatives = [self.parse_alt()]
+        while self.state.exact_type == token.VBAR:
             self.eat()
-            with suppress(Finish):
-                self.parse()
-            right = grammar.FreeUnit(tuple(self.result))
-            self.result.clear()
-            return grammar.Or[(left, right)]
-        elif self.state.exact_type in IGNORED:
+            alternatives.append(self.parse_alt())
+        if len(alternatives) == 1:
+            return alternatives[0]
+
+        return (
+            grammar.Or[
+                tuple(
+                    items[0] if len(items) == 1 else grammar.FreeUnit[items]
+                    for items in alternatives
+                )
+            ],
+        )
+
+    def parse_alt(self):
+        items = []
+        while self.state.exact_type in ITEM_START:
+            items.append(self.parse_item())
+        if not items:
+            self.error("Expected a grammar item")
+        return tuple(items)
+
+    def parse_item(self):
+        if self.state.exact_type == token.LSQB:
             self.eat()
-            return self.parse_single()
-        else:
-            pass
-            # Still WIP TO:DO
+            items = self.parse_rhs()
+            self.eat(token.RSQB)
+            return grammar.Optional[items]
 
-    def parse(self):
-        with suppress(Finish):
-            while self.state.exact_type != token.ENDMARKER:
-                result = self.parse_single()
-                self.result.append(result)
-                self.eat()
+        atom = self.parse_atom()
+        if self.state.exact_type == token.STAR:
+            self.eat()
+            return grammar.ZeroOrMore[atom]
+        elif self.state.exact_type == token.PLUS:
+            self.eat()
+            return grammar.OneOrMore[atom]
+        return atom
 
-        return tuple(self.result)
+    def parse_atom(self):
+        current = self.state
+        if current.exact_type in GROUPS:
+            self.eat()
+            items = self.parse_rhs()
+            self.eat(GROUPS[current.exact_type])
+            return grammar.Unit[items]
+        elif current.exact_type == token.NAME:
+            self.eat()
+            if current.string.isupper():
+                return grammar.Token[current.string]
+            elif current.string.islower():
+                return grammar.Rule[current.string]
+            else:
+                raise ValueError(f"Unknown grammar item, '{current.string}'.")
+        elif current.exact_type == token.STRING:
+            self.eat()
+            return grammar.Match[current.string[1:-1]]
+        else:
+            self.error("Expected a grammar item")
 
 
+@functools.lru_cache(maxsize=1024)
 def parse_rule(source):
+    # Memoized, since every factory parses the same rules; the result is
+    # shared, so it must not be modified.
     rule_parser = RuleParser(source)
     return rule_parser.parse()
+
+
+def split_rules(source):
+    # {name: text} of the rules of a grammar file, sliced out of it by
+    # the offsets of the rule starts; comments and blank lines after a
+    # rule are left out.
+    starts = list(RULE_START.finditer(source))
+    ends = [match.start() for match in starts[1:]] + [len(source)]
+    rules = {}
+    for match, end in zip(starts, ends):
+        lines = source[match.end() : end].splitlines()
+        while lines and lines[-1].strip()[:1] in {"", "#"}:
+            lines.pop()
+        rules[match.group(1)] = "\n".join(lines).strip()
+    return rules
+
+
+class LazyRules(Mapping):
+    # The representatives of the rules, parsed from their texts on the
+    # first lookup of each.
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.parsed = {}
+
+    def __getitem__(self, name):
+        if name not in self.parsed:
+            self.parsed[name] = parse_rule(self.texts[name])
+        return self.parsed[name]
+
+    def __iter__(self):
+        return iter(self.texts)
+
+    def __len__(self):
+        return len(self.texts)
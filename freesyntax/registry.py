@@ -0,0 +1,69 @@
+import re
+
+from freesyntax.lib2to3 import pytree
+from freesyntax.lib2to3.pgen2 import grammar as _grammar
+from freesyntax.lib2to3.pgen2 import token as _token
+from freesyntax.lib2to3.pgen2 import tokenize as _tokenize
+
+
+class TokenRegistry:
+    # The token table of a factory: the token numbers and names, the
+    # operators and the tokenizer pattern recognizing them.  It starts
+    # as a copy of the stock tables, so registering a token leaves the
+    # other factories (and the module level tables) alone.  Token
+    # numbers can be looked up as attributes, e.g. tokens.NAME.
+
+    def __init__(self):
+        self.tok_name = dict(_token.tok_name)
+        self.numbers = {name: number for number, name in self.tok_name.items()}
+        self.opmap = dict(_grammar.opmap)
+        self.opvalue = dict(_grammar.opvalue)
+        self.registered = []
+        self.pseudoprog = _tokenize._compile(_tokenize.PseudoToken)
+
+    def __getattr__(self, name):
+        # Look at the __dict__ directly, this might be called while the
+        # instance is being unpickled.
+        numbers = self.__dict__.get("numbers", {})
+        if name in numbers:
+            return numbers[name]
+        raise AttributeError(name)
+
+    def register(self, token, token_name):
+        token_slot = max(self.tok_name.keys() ^ {_token.NT_OFFSET}) + 1
+        self.tok_name[token_slot] = token_name
+        self.numbers[token_name] = token_slot
+        self.opmap[token] = token_slot
+        self.opvalue[token_name] = token
+        self.registered.append((token, token_name, token_slot))
+        self.pseudoprog = _tokenize._compile(self._pseudo_token())
+        return token_slot
+
+    def _pseudo_token(self):
+        # The registered operators are tried first, longest first, and
+        # along with the stock operators starting with them (e.g. "!="
+        # for "!"), which would be split in two otherwise.
+        registered = {token for token, _, _ in self.registered}
+        operators = registered | {
+            operator
+            for operator in self.opmap
+            if operator.startswith(tuple(registered))
+        }
+        operators = sorted(operators, key=len, reverse=True)
+        return _tokenize.Whitespace + _tokenize.group(
+            _tokenize.group(*map(re.escape, operators)),
+            _tokenize.PseudoExtras,
+            _tokenize.Number,
+            _tokenize.Funny,
+            _tokenize.ContStr,
+            _tokenize.Name,
+        )
+
+    def generate_tokens(self, readline):
+        return _tokenize.generate_tokens(readline, self.pseudoprog)
+
+    def leaf(self, token_name):
+        if token_name not in self.opvalue:
+            raise ValueError(f"Unknown token, {token_name}!")
+        value = self.opvalue[token_name]
+        return pytree.Leaf(self.opmap[value], value)
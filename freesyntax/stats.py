@@ -0,0 +1,62 @@
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict
+
+
+@dataclass
+class RuleStats:
+    nodes: int = 0
+    calls: int = 0
+    hits: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def add(self, elapsed, hit):
+        self.calls += 1
+        self.hits += hit
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
+
+@dataclass
+class TransformStats:
+    # Counters of the transformers, by rule: the nodes of the rule that
+    # were visited, the calls of the transformer and how many of them
+    # returned a replacement (hits), and the total and longest call time
+    # in seconds.  Transforms done in other processes aren't counted.
+    rules: Dict[str, RuleStats] = field(default_factory=dict)
+
+    def __getitem__(self, rule):
+        return self.rules[rule]
+
+    def record(self, rule):
+        if rule not in self.rules:
+            self.rules[rule] = RuleStats()
+        return self.rules[rule]
+
+    def profiled(self, rule, transformer, eager=False):
+        stats = self.record(rule)
+
+        def profiled(node):
+            # The eager transformers are called on every node they visit
+            stats.nodes += eager
+            start = time.perf_counter()
+            result = transformer(node)
+            stats.add(time.perf_counter() - start, result is not None)
+            return result
+
+        return profiled
+
+    def visit(self, rule):
+        self.record(rule).nodes += 1
+
+    def reset(self):
+        self.rules.clear()
+
+    def as_dict(self):
+        return {rule: asdict(stats) for rule, stats in self.rules.items()}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
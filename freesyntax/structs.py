@@ -1,3 +1,5 @@
+from contextvars import ContextVar
+
 from freesyntax.lib2to3.fixer_util import *
 from freesyntax.lib2to3.pgen2 import grammar, token
 from freesyntax.lib2to3.pytree import *
@@ -8,9 +10,23 @@ class _AutoMeta(type):
         return cls.auto(value)
 
 
+# The factory whose transformers are running in this thread (or task),
+# see RuleFactory.bound
+bound_factory = ContextVar("bound_factory", default=None)
+
+
+def _bound_tokens():
+    # The tokens of the bound factory, if any
+    if factory := bound_factory.get():
+        return factory.tokens
+    return None
+
+
 class AutoLeaf(metaclass=_AutoMeta):
     @staticmethod
     def auto(token):
+        if tokens := _bound_tokens():
+            return tokens.leaf(token)
         if token in grammar.opvalue:
             value = grammar.opvalue[token]
             return Leaf(grammar.opmap[value], value)
@@ -21,12 +37,14 @@ class AutoLeaf(metaclass=_AutoMeta):
 class Tokens(metaclass=_AutoMeta):
     @staticmethod
     def auto(value):
+        if tokens := _bound_tokens():
+            return getattr(tokens, value)
         return getattr(token, value)
 
 
 class Symbols(metaclass=_AutoMeta):
-    @classmethod
-    def auto(cls, value):
-        if not hasattr(cls, "factory"):
+    @staticmethod
+    def auto(value):
+        if not (factory := bound_factory.get()):
             raise ValueError("Factory is not bound!")
-        return cls.factory.rule_grammar.grammar.symbol2number[value]
+        return factory.rule_grammar.grammar.symbol2number[value]